@@ -0,0 +1,59 @@
+# Cost of a verification failing over and over in a loop, with and without
+# aggregate, in time and in what ends up logged and kept.
+#
+#     python benchmarks/bench_aggregate.py [iterations]
+
+from __future__ import print_function
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from disclose import OperandWrapper, VerificationSession
+
+
+class CountingHandler(logging.Handler):
+
+    def __init__(self):
+
+        logging.Handler.__init__(self, logging.DEBUG)
+        self.records = 0
+        self.characters = 0
+
+    def emit(self, record):
+
+        self.records += 1
+        self.characters += len(self.format(record))
+
+
+def run(aggregate, iterations):
+
+    handler = CountingHandler()
+    logger = logging.getLogger('disclose.benchmark.{}'.format(aggregate))
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    logger.propagate = False
+    verify = VerificationSession(logger=logger, aggregate=aggregate)
+    start = time.time()
+    for index in range(iterations):
+        item = OperandWrapper({'id': index, 'price': index % 100}, 'item')
+        verify(item['price'] < 50)
+    elapsed = time.time() - start
+    print('{:<10} {:>8.1f} us/check {:>8} log records {:>12} log characters {:>8} failures kept'.format(
+        'aggregate' if aggregate else 'default', elapsed / iterations * 1e6, handler.records,
+        handler.characters, len(verify.failures)))
+    return verify
+
+
+def main(iterations=20000):
+
+    run(False, iterations)
+    verify = run(True, iterations)
+    print()
+    print(verify.summary())
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
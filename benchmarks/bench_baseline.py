@@ -0,0 +1,58 @@
+# Writing and reading a baseline of many distinct verifications: the size of
+# the file, how long opening it takes, and the cost of classifying a
+# verification against it.
+#
+#     python benchmarks/bench_baseline.py [verifications]
+
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from disclose.baseline import Baseline, BaselineWriter
+
+
+class Record(object):
+
+    # Just what a baseline looks at of a VerificationRecord
+    def __init__(self, index):
+
+        self.location = ('tests/test_module{}.py'.format(index % 100), index // 100, 'test')
+        self.template = '({}) == ({})'
+        self.passed = index % 10 != 0
+
+
+def main(count=200000):
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'baseline')
+        records = [Record(index) for index in range(count)]
+        start = time.time()
+        with BaselineWriter(path) as writer:
+            for record in records:
+                writer(record)
+        print('write    {:>8.2f} s for {} verifications, {:.1f} MB'.format(time.time() - start, count,
+                                                                         os.path.getsize(path) / 1e6))
+        start = time.time()
+        baseline = Baseline(path)
+        print('open     {:>8.2f} ms'.format((time.time() - start) * 1e3))
+        try:
+            known = records[count // 2]
+            unknown = Record(count + 1)
+            for name, record in (('known', known), ('new', unknown)):
+                best = min(timeit.repeat(lambda: baseline.classify(record), number=20000, repeat=5)) / 20000
+                print('classify {:>8.2f} us   {}: {}'.format(best * 1e6, name, baseline.classify(record)))
+        finally:
+            baseline.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
@@ -0,0 +1,81 @@
+# Comparing two large files with buffers_equal against reading them into
+# bytes and comparing those, in time and in memory allocated by Python.
+#
+#     python benchmarks/bench_buffers.py [megabytes]
+
+from __future__ import print_function
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from disclose import VerificationSession
+from disclose.buffers import mapped
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+logger = logging.getLogger('disclose.benchmark')
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+
+def write_file(path, block, megabytes, last_byte):
+
+    with open(path, 'wb') as output:
+        for _ in range(megabytes - 1):
+            output.write(block)
+        output.write(block[:-1] + last_byte)
+
+
+def measure(name, compare):
+
+    start = time.time()
+    passed = compare()
+    elapsed = time.time() - start
+    # Measured separately, as tracing allocations slows everything down
+    peak = 0
+    if tracemalloc:
+        tracemalloc.start()
+        compare()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    print('{:<16} {:>8.3f} s {:>10.1f} MB peak allocated   passed: {}'.format(name, elapsed, peak / 1e6, passed))
+
+
+def main(megabytes=256):
+
+    directory = tempfile.mkdtemp()
+    try:
+        left, right = os.path.join(directory, 'left'), os.path.join(directory, 'right')
+        block = os.urandom(1 << 20)
+        write_file(left, block, megabytes, b'a')
+        write_file(right, block, megabytes, b'b')
+        verify = VerificationSession(logger=logger)
+
+        def read_and_compare():
+
+            with open(left, 'rb') as left_file, open(right, 'rb') as right_file:
+                return verify(left_file.read() == right_file.read())
+
+        def buffers_equal():
+
+            with mapped(left) as left_buffer, mapped(right) as right_buffer:
+                return verify.buffers_equal(left_buffer, right_buffer)
+
+        measure('read()', read_and_compare)
+        measure('buffers_equal', buffers_equal)
+        print('\n'.join(verify.failures[-1].details))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
@@ -0,0 +1,44 @@
+# Cost of verifying in a sub-session made by child(), against in the root
+# session, at different depths and numbers of sibling scenarios.  Rolling a
+# child's state up to its parents only happens when it starts failing, so
+# checks cost the same wherever they are made.
+#
+#     python benchmarks/bench_children.py
+
+from __future__ import print_function
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from disclose import OperandWrapper, VerificationSession
+
+
+logger = logging.getLogger('disclose.benchmark')
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+number = OperandWrapper(7, 'number')
+
+
+def main(repeats=5, loops=20000):
+
+    root = VerificationSession(logger=logger)
+    sessions = [('root', root)]
+    session = root
+    for depth in range(1, 4):
+        for scenario in range(1000):
+            session.child('scenario{}'.format(scenario))
+        session = session.child('scenario0')
+        sessions.append(('depth {}'.format(depth), session))
+    for name, session in sessions:
+        # One failure first, so both the session and its parents are already failing
+        session(number == 8)
+        best = min(timeit.repeat(lambda: session(number + 1 == 8), number=loops, repeat=repeats)) / loops
+        print('{:<10} {:>8.2f} us   root passing: {}'.format(name, best * 1e6, bool(root)))
+
+
+if __name__ == '__main__':
+    main()
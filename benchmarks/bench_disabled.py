@@ -0,0 +1,72 @@
+# Overhead of verifications with disclose disabled, against plain assert
+# statements, in a loop exercising a small piece of code under test.
+#
+#     python benchmarks/bench_disabled.py
+
+from __future__ import print_function
+import json
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import disclose
+from disclose import OperandWrapper, VerificationSession
+
+
+logger = logging.getLogger('disclose.benchmark')
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+# About the smallest piece of work worth benchmarking on its own
+DOCUMENT = {'items': [{'id': index, 'name': 'item{}'.format(index), 'price': index * 0.5} for index in range(20)]}
+TEXT = json.dumps(DOCUMENT)
+
+
+def code_under_test():
+
+    return json.loads(TEXT)
+
+
+def with_assert():
+
+    document = code_under_test()
+    assert document['items'][10]['price'] == 5.0
+
+
+def with_verify(verify):
+
+    def check():
+
+        document = OperandWrapper(code_under_test(), 'document')
+        verify(document['items'][10]['price'] == 5.0)
+    return check
+
+
+def main(repeats=15, loops=10000):
+
+    verify = VerificationSession(logger=logger)
+    enabled = with_verify(verify)
+    disabled = with_verify(verify)
+    timings = {'assert': [], 'disabled': [], 'enabled': []}
+    # Interleaved, so drift in the machine's speed affects them all alike
+    for _ in range(repeats):
+        timings['assert'].append(timeit.timeit(with_assert, number=loops))
+        disclose.disable()
+        try:
+            timings['disabled'].append(timeit.timeit(disabled, number=loops))
+        finally:
+            disclose.enable()
+        timings['enabled'].append(timeit.timeit(enabled, number=loops))
+    baseline = min(timings['assert'])
+    for name in ('assert', 'disabled', 'enabled'):
+        best = min(timings[name])
+        print('{:<10} {:>8.2f} us {:>+8.2f} us {:>+8.1f}%'.format(name, best / loops * 1e6,
+                                                               (best - baseline) / loops * 1e6,
+                                                               (best / baseline - 1) * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# Throughput of VerificationSession.forall over a CPU-bound predicate, in this
+# process and over a pool of processes.  Scales with the number of cores, as
+# long as the predicate costs more than sending its item to a worker.
+#
+#     python benchmarks/bench_forall.py [items]
+
+from __future__ import print_function
+import logging
+import os
+import sys
+import time
+from multiprocessing import cpu_count
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from disclose import VerificationSession
+
+
+logger = logging.getLogger('disclose.benchmark')
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+
+def collatz_bounded(number):
+
+    # Whether number reaches 1 within 500 steps of the Collatz sequence
+    steps = 0
+    number += 1
+    while number != 1 and steps < 500:
+        number = number // 2 if number % 2 == 0 else 3 * number + 1
+        steps += 1
+    return number == 1
+
+
+def main(items=200000):
+
+    counts = sorted(set([1, 2, cpu_count()]))
+    for processes in counts:
+        verify = VerificationSession(logger=logger)
+        start = time.time()
+        verify.forall(range(items), collatz_bounded, processes=processes, chunksize=5000)
+        elapsed = time.time() - start
+        print('{:>3} processes {:>10.0f} items/s {:>6} failures'.format(processes, items / elapsed,
+                                                                    len(verify.failures)))
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
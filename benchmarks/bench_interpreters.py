@@ -0,0 +1,78 @@
+# Times the hot paths of disclose on whichever interpreter runs it, for
+# comparing interpreters:
+#
+#     python2.7 benchmarks/bench_interpreters.py
+#     python3.11 benchmarks/bench_interpreters.py
+
+from __future__ import print_function
+import json
+import logging
+import os
+import platform
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from disclose import OperandWrapper, VerificationSession
+
+
+logger = logging.getLogger('disclose.benchmark')
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+verify = VerificationSession(logger=logger)
+
+number = OperandWrapper(7, 'number')
+numbers = OperandWrapper(list(range(1000)), 'numbers')
+plain_numbers = list(range(1000))
+response = OperandWrapper({'items': [{'price': index} for index in range(20)], 'count': 20}, 'response')
+
+
+def wrap():
+
+    OperandWrapper(7, 'number')
+
+
+def arithmetic():
+
+    (number + 3) * 2 - number // 2
+
+
+def compare_large():
+
+    numbers == plain_numbers
+
+
+def verify_scalar():
+
+    verify(number + 1 == 8)
+
+
+def verify_nested():
+
+    verify(response['items'][3]['price'] == 3)
+
+
+def verify_failing():
+
+    verify(response['count'] == 21)
+
+
+def dump_json():
+
+    json.dumps(response)
+
+
+CASES = (wrap, arithmetic, compare_large, verify_scalar, verify_nested, verify_failing, dump_json)
+
+
+def main(repeats=5, loops=2000):
+
+    print('{} {}'.format(platform.python_implementation(), platform.python_version()))
+    for case in CASES:
+        best = min(timeit.repeat(case, number=loops, repeat=repeats)) / loops
+        print('{:<16} {:>8.1f} us'.format(case.__name__, best * 1e6))
+
+
+if __name__ == '__main__':
+    main()
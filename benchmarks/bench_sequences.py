@@ -0,0 +1,59 @@
+# Comparing two streams of rows with sequences_equal against gathering them
+# into lists and comparing those, in time and in memory allocated by Python.
+#
+#     python benchmarks/bench_sequences.py [rows]
+
+from __future__ import print_function
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from disclose import VerificationSession
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+logger = logging.getLogger('disclose.benchmark')
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+
+def rows(count, bad_row=None):
+
+    for index in range(count):
+        yield (index, 'name{}'.format(index), index * 0.5 if index != bad_row else -1.0)
+
+
+def measure(name, compare):
+
+    start = time.time()
+    passed = compare()
+    elapsed = time.time() - start
+    # Measured separately, as tracing allocations slows everything down
+    peak = 0
+    if tracemalloc:
+        tracemalloc.start()
+        compare()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    print('{:<16} {:>8.3f} s {:>10.1f} MB peak allocated   passed: {}'.format(name, elapsed, peak / 1e6, passed))
+
+
+def main(count=1000000):
+
+    verify = VerificationSession(logger=logger)
+    for label, bad_row in (('equal', None), ('differ at end', count - 1)):
+        print(label)
+        measure('lists', lambda: verify(list(rows(count)) == list(rows(count, bad_row))))
+        measure('sequences_equal', lambda: verify.sequences_equal(rows(count), rows(count, bad_row)))
+    print('\n'.join(verify.failures[-1].details))
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
@@ -0,0 +1,37 @@
+# Cost of SnapshotPolicy per verification, against keeping live components.
+#
+#     python benchmarks/bench_snapshot.py
+
+from __future__ import print_function
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from disclose import OperandWrapper, VerificationSession, SnapshotPolicy
+
+
+logger = logging.getLogger('disclose.benchmark')
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+number = OperandWrapper(7, 'number')
+response = OperandWrapper({'items': [{'price': index, 'tags': list(range(50))} for index in range(1000)]},
+                          'response')
+
+
+def main(repeats=5, loops=100):
+
+    for name, snapshot in (('live', None), ('snapshot', SnapshotPolicy())):
+        verify = VerificationSession(logger=logger, snapshot=snapshot)
+        for label, check in (('scalar', lambda: verify(number + 1 == 8)),
+                             ('passing', lambda: verify(response['items'][3]['price'] == 3)),
+                             ('failing', lambda: verify(response['items'][3]['tags'][0] == 1))):
+            best = min(timeit.repeat(check, number=loops, repeat=repeats)) / loops
+            print('{:<10} {:<8} {:>8.1f} us'.format(name, label, best * 1e6))
+
+
+if __name__ == '__main__':
+    main()
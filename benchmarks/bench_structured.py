@@ -0,0 +1,52 @@
+# Cost per verification of logging text messages against structured records
+# formatted by disclose.jsonlog.JSONFormatter, with a handler taking every
+# record and with one only taking failures.
+#
+#     python benchmarks/bench_structured.py
+
+from __future__ import print_function
+import io
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from disclose import OperandWrapper, VerificationSession
+from disclose.jsonlog import JSONFormatter
+
+
+response = OperandWrapper({'items': [{'id': index, 'price': index * 0.5} for index in range(20)]}, 'response')
+
+
+class NullStream(io.TextIOBase):
+
+    def write(self, text):
+
+        return len(text)
+
+
+def session(structured, level):
+
+    handler = logging.StreamHandler(NullStream())
+    handler.setFormatter(JSONFormatter() if structured else logging.Formatter('%(levelname)s %(message)s'))
+    logger = logging.getLogger('disclose.benchmark.{}.{}'.format(structured, level))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return VerificationSession(logger=logger, structured=structured)
+
+
+def main(repeats=7, loops=5000):
+
+    for label, level in (('all records', logging.DEBUG), ('failures only', logging.ERROR)):
+        for name, structured in (('text', False), ('structured', True)):
+            verify = session(structured, level)
+            best = min(timeit.repeat(lambda: verify(response['items'][3]['price'] == 1.5),
+                                     number=loops, repeat=repeats)) / loops
+            print('{:<14} {:<11} {:>8.1f} us'.format(label, name, best * 1e6))
+
+
+if __name__ == '__main__':
+    main()
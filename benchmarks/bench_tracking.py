@@ -0,0 +1,52 @@
+# Cost of calling a method of a wrapped client object, and reading an attribute
+# of the result, under different tracking policies.
+#
+#     python benchmarks/bench_tracking.py
+
+from __future__ import print_function
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from disclose import OperandWrapper, TrackingPolicy
+
+
+class User(object):
+
+    def __init__(self, user_id):
+
+        self.user_id = user_id
+        self.name = 'user{}'.format(user_id)
+
+
+class Client(object):
+
+    def get_user(self, user_id, include_deleted=False):
+
+        return User(user_id)
+
+
+POLICIES = (('full', None),
+            ('attributes', TrackingPolicy(attributes=['get_user', 'name'])),
+            ('passthrough', TrackingPolicy(passthrough_calls=True)),
+            ('passthrough+attributes', TrackingPolicy(attributes=['get_user', 'name'], passthrough_calls=True)))
+
+
+def main(repeats=15, loops=20000):
+
+    raw = Client()
+    user_id = OperandWrapper(42, 'user_id')
+    best = min(timeit.repeat(lambda: raw.get_user(42, include_deleted=True).name, number=loops,
+                             repeat=repeats)) / loops
+    print('{:<24} {:>8.2f} us'.format('unwrapped', best * 1e6))
+    for name, policy in POLICIES:
+        client = OperandWrapper(raw, 'client', policy=policy)
+        best = min(timeit.repeat(lambda: client.get_user(user_id, include_deleted=True).name, number=loops,
+                                 repeat=repeats)) / loops
+        print('{:<24} {:>8.2f} us'.format(name, best * 1e6))
+
+
+if __name__ == '__main__':
+    main()
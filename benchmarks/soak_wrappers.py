@@ -0,0 +1,66 @@
+# Creates wrappers in a loop and checks memory stays flat, i.e. wrappers and
+# their metadata are freed once nothing refers to them.  Exits non-zero if not.
+#
+#     python benchmarks/soak_wrappers.py [count]
+
+from __future__ import print_function
+import gc
+import logging
+import os
+import resource
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from disclose import OperandWrapper, OperandMetadata, VerificationSession
+
+
+class Thing(object):
+
+    def __init__(self, x):
+
+        self.x = x
+
+
+def peak_rss_kb():
+
+    # Linux reports kilobytes.  The peak only stops rising if the live set stops growing.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def live_metadata():
+
+    return sum(1 for item in gc.get_objects() if isinstance(item, OperandMetadata))
+
+
+def churn(count, verify):
+
+    # Plain, specialized and container wrappers, and ones derived from them by operations
+    for index in range(count // 4):
+        thing = OperandWrapper(Thing(index), 'thing')
+        number = OperandWrapper(index, 'index')
+        mapping = OperandWrapper({'key': [index]}, 'mapping')
+        verify(thing.x + number == mapping['key'][0] * 2)
+
+
+def main(count=10 ** 7, warmup=10 ** 5, tolerance_kb=4096):
+
+    logger = logging.getLogger('disclose.soak')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    verify = VerificationSession(logger=logger)
+    churn(warmup, verify)
+    baseline_rss, baseline_metadata = peak_rss_kb(), live_metadata()
+    churn(count, verify)
+    gc.collect()
+    rss, metadata = peak_rss_kb(), live_metadata()
+    print('wrappers: {}  peak RSS: {} -> {} KB  live metadata: {} -> {}'.format(
+        count, baseline_rss, rss, baseline_metadata, metadata))
+    if rss - baseline_rss > tolerance_kb or metadata > baseline_metadata:
+        print('memory grew')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:2]]))
@@ -1,16 +1,381 @@
-from logging import getLogger
-from weakref import WeakKeyDictionary, ref, WeakValueDictionary
+from logging import getLogger, DEBUG, INFO, ERROR
 import math
-from functools import partial
+import operator
 import itertools
-from types import MethodType
-import inspect
-from traceback import format_tb, format_stack
+from collections import OrderedDict, deque
+from types import MethodType, FunctionType, BuiltinFunctionType
+import sys
+from traceback import format_tb, format_list
+import linecache
+import gc
+import os
+import random
+import time
+import threading
+from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import ThreadPool
+from disclose.diff import differences, worth_diffing, short_repr
+from disclose._compat import PY2, string_types, text_type, integer_types
+
+try:
+    from reprlib import Repr
+except ImportError:
+    from repr import Repr
+
+try:
+    from time import perf_counter_ns
+except ImportError:
+    from timeit import default_timer
+    
+    def perf_counter_ns():
+        
+        return int(default_timer() * 1e9)
+
+
+# Process wide switch that turns disclose off, for runs where only whether verifications pass matters
+# (e.g. benchmarks of the code under test): OperandWrapper(...) gives back the plain operand, and
+# verifications are only counted, with failures kept along with where they happened.  Set with
+# disable() and enable(), or the DISCLOSE_DISABLED environment variable.
+DISABLED = os.environ.get('DISCLOSE_DISABLED', '') not in ('', '0')
+
+def disable():
+    
+    global DISABLED
+    DISABLED = True
+
+def enable():
+    
+    global DISABLED
+    DISABLED = False
+
+def is_disabled():
+    
+    return DISABLED
+
+
+def exponential_backoff(initial=0.01, factor=2, maximum=1.0):
+    
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * factor, maximum)
+
+def jittered_backoff(initial=0.01, factor=2, maximum=1.0):
+    
+    # "Full jitter": a random delay up to the exponential one, so pollers don't synchronize
+    for delay in exponential_backoff(initial, factor, maximum):
+        yield random.uniform(0, delay)
+
+
+def _callable_name(function):
+    
+    meta = OperandMetadata.for_all(function)[0]
+    if meta and meta.description:
+        return meta.description
+    return getattr(function, '__name__', None) or str(function)
+
+def _call_capturing(function):
+    
+    try:
+        return False, function()
+    except Exception as error:
+        return True, error
+
+def _chunks(iterable, size):
+    
+    iterator = iter(iterable)
+    start = 0
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+def _check_chunk(predicate, start, items):
+    
+    # Runs in forall's worker processes, so only the failures (which are rare) are sent back, as
+    # (index, item text, description, dump values, error) tuples of plain strings
+    failures = []
+    snapshot = None
+    for index, item in enumerate(items, start):
+        try:
+            result = predicate(item)
+        except Exception as error:
+            failures.append((index, short_repr(item), None, (), repr(error)))
+            continue
+        if result:
+            continue
+        meta = OperandMetadata.lookup(result)
+        if meta is None:
+            failures.append((index, short_repr(item), None, (), None))
+        else:
+            snapshot = snapshot or SnapshotPolicy()
+            dump_values = tuple((component.description, component.operand)
+                                for component in snapshot(meta.components))
+            description = render_description(meta.description) if meta.description else None
+            failures.append((index, short_repr(item), description, dump_values, None))
+    return len(items), failures
+
+# Stands in for the items after the end of an iterable
+_END = object()
+
+def _sequence_difference(left, right, window):
+    
+    # Steps through both iterables together up to the first index they differ at, keeping only the
+    # last window pairs.  Returns the number of equal pairs, and details of the difference (or None
+    # if there isn't one) showing window items either side of it.
+    left, right = iter(left), iter(right)
+    preceding = deque(maxlen=window)
+    index = 0
+    while True:
+        left_item, right_item = next(left, _END), next(right, _END)
+        if left_item is _END and right_item is _END:
+            return index, None
+        if left_item is _END or right_item is _END or left_item != right_item:
+            break
+        preceding.append((left_item, right_item))
+        index += 1
+    if left_item is _END:
+        details = ['left ends at index {}, right goes on'.format(index)]
+    elif right_item is _END:
+        details = ['right ends at index {}, left goes on'.format(index)]
+    else:
+        details = ['first difference at index {}'.format(index)]
+    rows = list(preceding) + [(left_item, right_item)]
+    for _ in range(window):
+        left_item, right_item = next(left, _END), next(right, _END)
+        if left_item is _END and right_item is _END:
+            break
+        rows.append((left_item, right_item))
+    first = index - len(preceding)
+    for row_index, (left_item, right_item) in enumerate(rows, first):
+        details.append('{} [{}] {} | {}'.format('>' if row_index == index else ' ', row_index,
+                                                '<end>' if left_item is _END else short_repr(left_item),
+                                                '<end>' if right_item is _END else short_repr(right_item)))
+    return index, details
+
+def _ordered_results(pool, predicate, chunks, window):
+    
+    # Results of _check_chunk over chunks, in order, with at most window chunks in flight so a
+    # huge input is never read (or queued to the workers) all at once
+    pending = deque()
+    for start, items in chunks:
+        pending.append(pool.apply_async(_check_chunk, (predicate, start, items)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+class ComponentSnapshot(object):
+    
+    __slots__ = ('description', 'operand')
+    
+    def __init__(self, description, operand):
+        
+        self.description = description
+        self.operand = operand
+
+
+class SnapshotPolicy(object):
+    
+    # Pass as a session's snapshot to copy what components are worth at verification time, so
+    # records read later (by sinks, reports, etc.) aren't affected by operands mutating after the
+    # check.  Immutable primitives are kept as they are, and anything else as its text, cut short
+    # so the cost per verification stays bounded.
+    IMMUTABLE_TYPES = (type(None), bool, float, complex, text_type, bytes) + integer_types
+    CONTAINER_TYPES = (dict, list, tuple, set, frozenset)
+    
+    def __init__(self, max_components=32, max_length=200, max_items=8):
+        
+        self.max_components = max_components
+        self.max_length = max_length
+        self.repr = Repr()
+        self.repr.maxstring = self.repr.maxother = max_length
+        for limit in ('maxlist', 'maxtuple', 'maxdict', 'maxset', 'maxfrozenset', 'maxdeque', 'maxarray'):
+            setattr(self.repr, limit, max_items)
+    
+    def value(self, operand):
+        
+        # Exact type checks, as subclasses can be mutable
+        if type(operand) in self.IMMUTABLE_TYPES:
+            return operand
+        if isinstance(operand, self.CONTAINER_TYPES):
+            return self.repr.repr(operand)
+        # Other objects are dumped with str(), so that's what is kept
+        text = str(operand)
+        if len(text) > self.max_length:
+            text = text[:self.max_length - 3] + '...'
+        return text
+    
+    def __call__(self, components):
+        
+        snapshots = []
+        # The same operand often appears several times in one verification's components
+        values = {}
+        for component in components[:self.max_components]:
+            key = id(component.operand)
+            if key not in values:
+                try:
+                    values[key] = self.value(component.operand)
+                except Exception as error:
+                    values[key] = '<snapshot failed: {}>'.format(error.__class__.__name__)
+            snapshots.append(ComponentSnapshot(render_description(component.description), values[key]))
+        if len(components) > self.max_components:
+            snapshots.append(ComponentSnapshot('...', '{} more not captured'.format(
+                len(components) - self.max_components)))
+        return snapshots
+
+
+class VerificationRecord(object):
+    
+    __slots__ = ('result', 'passed', 'description', 'annotation', 'components', 'location', 'stack',
+                 'details', 'template', 'baseline_status')
+    
+    def __init__(self, result, description, annotation, components, frame, details=(), template=None):
+        
+        self.details = details
+        # The description with placeholders for its undescribed values, which identifies the
+        # verification along with its location (see description_template)
+        self.template = description if template is None else template
+        # How the outcome compares with a session's baseline, if it has one
+        self.baseline_status = None
+        self.result = result
+        self.passed = bool(result)
+        self.description = description
+        self.annotation = annotation
+        self.components = components
+        code = frame.f_code
+        self.location = (code.co_filename, frame.f_lineno, code.co_name)
+        # Only the raw frame data is kept; source lines are looked up when the stack is rendered.
+        self.stack = None
+        if not self.passed:
+            stack = []
+            while frame is not None:
+                stack.append((frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name))
+                frame = frame.f_back
+            stack.reverse()
+            self.stack = stack
+    
+    @classmethod
+    def located(cls, result, annotation, frame):
+        
+        # A failure recorded while disclose is disabled, which only has where it happened, with the
+        # source line standing in for its description
+        record = cls.__new__(cls)
+        code = frame.f_code
+        record.location = (code.co_filename, frame.f_lineno, code.co_name)
+        record.result = result
+        record.passed = False
+        record.description = linecache.getline(code.co_filename, frame.f_lineno).strip()
+        record.annotation = annotation
+        record.components = ()
+        record.details = ()
+        record.stack = None
+        record.template = record.description
+        record.baseline_status = None
+        return record
+    
+    def dump_values(self):
+        
+        dump_values = []
+        for component in self.components:
+            try:
+                dump_value = '{} = {}'.format(component.description, component.operand)
+            except Exception:
+                pass
+            else:
+                dump_values.append(dump_value)
+        return dump_values
+    
+    def format_stack(self):
+        
+        stack = self.stack if self.stack is not None else [self.location]
+        return ''.join(format_list([(filename, lineno, name, linecache.getline(filename, lineno).strip() or None)
+                                    for filename, lineno, name in stack]))
+
+
+# How a verification's outcome compares with the last run's (see disclose.baseline)
+NEW_CHECK = 'new check'
+NEW_FAILURE = 'new failure'
+STILL_FAILING = 'still failing'
+FIXED = 'fixed'
+STILL_PASSING = 'still passing'
+BASELINE_STATUSES = (NEW_CHECK, NEW_FAILURE, STILL_FAILING, FIXED, STILL_PASSING)
+
+
+class LazyMessage(object):
+    
+    # The message of a structured log record, only formatted if a handler asks for its text.  It
+    # has everything a session logs as text, so text handlers alongside structured ones lose nothing.
+    __slots__ = ('formatter', 'record')
+    
+    def __init__(self, formatter, record):
+        
+        self.formatter = formatter
+        self.record = record
+    
+    def __str__(self):
+        
+        record = self.record
+        lines = [self.formatter(record.result, render_description(record.description), record.annotation)]
+        lines.extend(record.dump_values())
+        if record.details:
+            lines.append('Differences:')
+            lines.extend(record.details)
+        return '\n'.join(lines)
+
+
+class FailureGroup(object):
+    
+    # Repeats of one failing verification (the same description template at the same line), kept by
+    # an aggregating session in place of a record per failure.  first and last are the numbers of
+    # the checks (counting from 1) it first and last failed at.
+    __slots__ = ('location', 'count', 'first', 'last', 'exemplars', 'last_record')
+    MAX_DUMP_LENGTH = 200
+    
+    def __init__(self, record, check):
+        
+        self.location = record.location
+        self.count = 1
+        self.first = self.last = check
+        self.exemplars = [record]
+        self.last_record = record
+    
+    def add(self, record, check, max_exemplars):
+        
+        self.count += 1
+        self.last = check
+        self.last_record = record
+        if len(self.exemplars) < max_exemplars:
+            self.exemplars.append(record)
+    
+    def summary(self):
+        
+        filename, lineno, function = self.location
+        lines = ['{} x {}:{} in {} (first at check {}, last at check {})'.format(
+            self.count, filename, lineno, function, self.first, self.last)]
+        for record in self.exemplars:
+            lines.append('  ' + render_description(record.description).replace('\n', '\n  '))
+            # Dump values are cut short, as a few exemplars of every group can add up
+            for dump_value in record.dump_values():
+                if len(dump_value) > self.MAX_DUMP_LENGTH:
+                    dump_value = dump_value[:self.MAX_DUMP_LENGTH - 3] + '...'
+                lines.append('    ' + dump_value.replace('\n', '\n    '))
+        if self.count > len(self.exemplars):
+            lines.append('  ... and {} more, the last: {}'.format(self.count - len(self.exemplars),
+                                                              render_description(self.last_record.description)))
+        return '\n'.join(lines)
 
 
 class VerificationSession(object):
     
     logger = default_logger = getLogger('test.validation')
+    # Most differences reported when an equality verification fails
+    diff_limit = 10
+    # Failing records kept per FailureGroup of an aggregating session
+    max_exemplars = 3
     
     # staticmethod   converted to static after reference in __init__
     def default_message_formatter(result, description, annotation):
@@ -34,16 +399,43 @@ class VerificationSession(object):
         message = []
         if exc_type == AssertionError:
             self.logger.debug(''.join(format_tb(traceback)))
-            message.append('Assertion failed: %s' % exc_value.message)
-        if self.failures:
+            message.append('Assertion failed: %s' % exc_value)
+        if self.failures or self._failing_children:
             message.append('Verification failed.')
+            if self.aggregate:
+                message.append(self.summary())
         assert not message, '\n'.join(message)
     
     def __init__(self, message_formatter=default_message_formatter,
                  block_handler=default_block_handler, logger=None,
-                 context_exit_handler=None):
+                 context_exit_handler=None, sinks=None, snapshot=None, aggregate=False, structured=False,
+                 baseline=None):
         
         self.failures = []
+        self.checks = 0
+        # With aggregate, a verification failing again at the same place is only counted in its
+        # FailureGroup: failures, the log and sinks get the first failure of each group only.
+        self.aggregate = aggregate
+        self.failure_groups = OrderedDict()
+        # With structured, each verification is logged as one record with the VerificationRecord as
+        # its verification attribute (see disclose.jsonlog), rather than as several lines of text
+        self.structured = structured
+        # A disclose.baseline.Baseline from an earlier run, which each verification is classified
+        # against, counting how many fall in each class
+        self.baseline = baseline
+        self.baseline_counts = dict.fromkeys(BASELINE_STATUSES, 0)
+        # Sub-sessions made by child(), and how many of them are failing.  A child tells its parent
+        # when it starts or stops failing, so a parent's truth is kept up to date at no cost.
+        self.name = None
+        self.parent = None
+        self.children = OrderedDict()
+        self._failing_children = 0
+        self._lock = threading.Lock()
+        # Sinks are called with each VerificationRecord, e.g. the writers in disclose.report
+        self.sinks = list(sinks) if sinks else []
+        # A SnapshotPolicy (or any callable mapping components to copies of them), or None to keep
+        # the live components
+        self.snapshot = snapshot
         self.block_handler = block_handler
         self.message_formatter = message_formatter
         if context_exit_handler:
@@ -56,44 +448,375 @@ class VerificationSession(object):
     
     def __call__(self, result, annotation='', blocking=False):
         
-        stack = inspect.stack()
+        if DISABLED:
+            if result:
+                # count(), cut down to what a passing verification needs
+                with self._lock:
+                    self.checks += 1
+                return result
+            return self.count(result, annotation, blocking, sys._getframe(1))
+        return self._verify(result, annotation, blocking, sys._getframe(1))
+    
+    def count(self, result, annotation='', blocking=False, frame=None):
+        
+        # What a verification comes down to while disclose is disabled: no descriptions, logging
+        # or sinks
+        if result:
+            with self._lock:
+                self.checks += 1
+            return result
+        record = VerificationRecord.located(result, annotation, frame or sys._getframe(1))
+        with self._lock:
+            self.checks += 1
+            now_failing = not (self.failures or self._failing_children)
+            self.failures.append(record)
+        if now_failing and self.parent is not None:
+            self.parent._child_failing(1)
+        if blocking:
+            self.block_handler(result, self.message_formatter(result, record.description, annotation))
+        return result
+    
+    def _verify(self, result, annotation, blocking, frame):
+        
+        if DISABLED:
+            return self.count(result, annotation, blocking, frame)
         result_meta = OperandMetadata.for_all(result)[0]
         result_real = result_meta.operand if result_meta else result
-        dump_values = []
         if result_meta:
             if result_meta.description:
                 description = result_meta.description
             else:
-                description = result_real
-            for component in result_meta.components:
-                try:
-                    dump_value = '{} = {}'.format(component.description, component.operand)
-                except Exception:
-                    pass
-                else:
-                    dump_values.append(dump_value)
+                description = Description('{}', result_real)
+            components = result_meta.components
+            compared = result_meta.compared
         else:
-            description = str(result_real)
+            description = Description('{}', result_real)
+            components = []
+            compared = None
+        return self.record(result, description, components, annotation, blocking, frame, compared)
+    
+    def record(self, result, description, components=(), annotation='', blocking=False, frame=None,
+               compared=None, details=(), template=None):
+        
+        # Components are anything with description and operand attributes, so callers that work
+        # out descriptions without OperandWrapper (e.g. disclose.rewrite) can report through here.
+        # compared is the (left, right, left description) of an equality verification, which is
+        # diffed if it fails.  Callers that work out their own differences pass them as details.
+        # template identifies the verification (see description_template), for callers that know it.
+        if frame is None:
+            frame = sys._getframe(1)
+        # Failures are grouped by template, so descriptions that differ only in the values of
+        # undescribed operands (e.g. loop variables) land in the same group.  Worked out only for
+        # what reads it: grouping, the baseline and sinks (e.g. disclose.baseline.BaselineWriter).
+        if template is None and (self.sinks or self.baseline is not None or (self.aggregate and not result)):
+            template = description_template(description)
+        if not self.structured or self.snapshot is not None:
+            # A snapshot copies the components only, so the description is fixed here too
+            description = render_description(description)
+        # else the Description goes on the record as it is, rendered only when a handler reads it
+        if compared is not None and not result:
+            left, right, path = compared
+            if worth_diffing(left, right):
+                details = differences(left, right, path, self.diff_limit)
+        if self.snapshot is not None:
+            components = self.snapshot(components)
+        record = VerificationRecord(result, description, annotation, components, frame, details, template)
+        if self.baseline is not None:
+            record.baseline_status = self.baseline.classify(record)
+            with self._lock:
+                self.baseline_counts[record.baseline_status] += 1
+        group = None
+        now_failing = False
+        with self._lock:
+            self.checks += 1
+            if not record.passed:
+                now_failing = not (self.failures or self._failing_children)
+                if self.aggregate:
+                    key = (record.location[0], record.location[1], record.template)
+                    group = self.failure_groups.get(key)
+                    if group is None:
+                        self.failure_groups[key] = FailureGroup(record, self.checks)
+                    else:
+                        group.add(record, self.checks, self.max_exemplars)
+                if group is None:
+                    self.failures.append(record)
+        if now_failing and self.parent is not None:
+            self.parent._child_failing(1)
+        if group is not None:
+            if blocking:
+                self.block_handler(result, self.message_formatter(result, render_description(description),
+                                                                  annotation))
+            return result
+        if self.structured:
+            self.logger.log(INFO if record.passed else ERROR, LazyMessage(self.message_formatter, record),
+                            extra={'verification': record})
+            for sink in self.sinks:
+                sink(record)
+            if blocking and not record.passed:
+                self.block_handler(result, self.message_formatter(result, render_description(description),
+                                                                  annotation))
+            return result
+        dump_values = record.dump_values()
         message = self.message_formatter(result, description, annotation)
-        if result:
+        if record.passed:
             self.logger.info(message)
             dump_value_writer = self.logger.debug
         else:
-            self.failures.append((result, description, annotation, stack))
             self.logger.error(message)
             dump_value_writer = self.logger.info
         if dump_values:
             dump_value_writer('\n'.join(dump_values))
-        if not result:
+        if details:
+            dump_value_writer('Differences:\n' + '\n'.join(details))
+        for sink in self.sinks:
+            sink(record)
+        if not record.passed:
             if blocking:
                 self.block_handler(result, message)
-            self.logger.debug(''.join(format_stack(stack[1][0])))
-            #self.logger.debug('\n'.join('{1} line {2} in {3}'.format(*frame) for frame in stack))
+            if self.logger.isEnabledFor(DEBUG):
+                self.logger.debug(record.format_stack())
         return result
     
+    def timed(self, function, budget, repeats=10, percentile=99, warmup=1, annotation='', blocking=False):
+        
+        # Verifies the given percentile of the time taken by function() is within budget (in
+        # seconds).  The garbage collector is held off while timing, so collections triggered
+        # by earlier work don't land in the samples.
+        if repeats < 1:
+            raise ValueError('timed takes repeats of at least 1, not {!r}.'.format(repeats))
+        for _ in range(warmup):
+            function()
+        samples = []
+        gc_enabled = gc.isenabled()
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(repeats):
+                start = perf_counter_ns()
+                function()
+                samples.append(perf_counter_ns() - start)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        samples.sort()
+        name = _callable_name(function)
+        statistics = []
+        for statistic, index in (('min', 0), ('median', (len(samples) - 1) // 2), ('max', len(samples) - 1)):
+            wrapper = OperandWrapper(samples[index] / 1e9, '{}(timed({}))'.format(statistic, name))
+            if not DISABLED:
+                statistics.append(OperandMetadata.for_(wrapper))
+        rank = max(int(math.ceil(percentile / 100.0 * len(samples))) - 1, 0)
+        measured = OperandWrapper(samples[rank] / 1e9, 'p{:g}(timed({}))'.format(percentile, name), statistics)
+        return self._verify(measured <= budget, annotation, blocking, sys._getframe(1))
+    
+    def eventually(self, predicate, timeout, backoff=exponential_backoff, annotation='', blocking=False,
+                   exceptions=()):
+        
+        # Re-evaluates predicate() until it's truthy or timeout (in seconds) has passed, sleeping
+        # between attempts according to backoff (an iterable of delays, or a callable returning
+        # one), and verifies only the final result.  exceptions are treated as failed attempts.
+        frame = sys._getframe(1)
+        delays = iter(backoff() if callable(backoff) else backoff)
+        start = perf_counter_ns()
+        deadline = start + int(timeout * 1e9)
+        attempts = 0
+        while True:
+            attempts += 1
+            error = None
+            try:
+                result = predicate()
+            except exceptions as caught:
+                result, error = None, caught
+            if error is None and result:
+                break
+            remaining = (deadline - perf_counter_ns()) / 1e9
+            if remaining <= 0:
+                break
+            time.sleep(min(next(delays, remaining), remaining))
+        return self._eventually_outcome(predicate, result, error, attempts, perf_counter_ns() - start,
+                                        annotation, blocking, frame)
+    
+    def eventually_async(self, predicate, timeout, backoff=exponential_backoff, annotation='', blocking=False,
+                         exceptions=()):
+        
+        # asyncio version of eventually; predicate may return an awaitable.  Returns a coroutine.
+        from disclose._async import eventually
+        return eventually(self, predicate, timeout, backoff, annotation, blocking, exceptions, sys._getframe(1))
+    
+    def concurrently(self, functions, max_workers=None, annotation='', blocking=False):
+        
+        # Calls each of functions on a thread pool and verifies what they return.  Results are
+        # verified on this thread, in the order functions were given, so the log reads the same
+        # however the calls interleave.  A call that raises is a failed verification.
+        functions = list(functions)
+        if not functions:
+            return []
+        frame = sys._getframe(1)
+        pool = ThreadPool(max_workers or min(32, len(functions)))
+        try:
+            results = []
+            for function, (raised, value) in zip(functions, pool.imap(_call_capturing, functions)):
+                if raised:
+                    results.append(self.record(False, '{}() raised {!r}'.format(_callable_name(function), value),
+                                               (), annotation, blocking, frame))
+                else:
+                    results.append(self._verify(value, annotation, blocking, frame))
+        finally:
+            pool.terminate()
+        return results
+    
+    def forall(self, iterable, predicate, processes=None, chunksize=1000, annotation='', blocking=False):
+        
+        # Verifies predicate(item) for every item of iterable, in chunks spread over a pool of
+        # processes (one per CPU by default; with processes <= 1, here instead).  predicate and the
+        # items have to be picklable.  Passing items are only counted, and failing ones recorded
+        # in input order, each as a verification of its own.  Returns whether every item passed.
+        frame = sys._getframe(1)
+        name = _callable_name(predicate)
+        if processes is None:
+            processes = cpu_count()
+        chunks = _chunks(iterable, chunksize)
+        pool = None
+        if processes <= 1:
+            outcomes = (_check_chunk(predicate, start, items) for start, items in chunks)
+        else:
+            pool = Pool(processes)
+            outcomes = _ordered_results(pool, predicate, chunks, processes * 2)
+        total = failed = 0
+        try:
+            for count, failures in outcomes:
+                with self._lock:
+                    self.checks += count - len(failures)
+                total += count
+                failed += len(failures)
+                for failure in failures:
+                    self._forall_failure(name, failure, annotation, blocking, frame)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        self.logger.info('forall({}): {} of {} items failed'.format(name, failed, total))
+        return not failed
+    
+    def _forall_failure(self, name, failure, annotation, blocking, frame):
+        
+        index, item, description, dump_values, error = failure
+        components = [ComponentSnapshot('items[{}]'.format(index), item)]
+        components.extend(ComponentSnapshot(*dump_value) for dump_value in dump_values)
+        # Templates are the same for every item, so an aggregating session groups the failures
+        if error is not None:
+            description = Description('{}(items[{}]) raised {}', name, index, error)
+        elif description is not None:
+            description = Description('{}(items[{}]): {}', name, index, description)
+        else:
+            description = Description('{}(items[{}])', name, index)
+        self.record(False, description, components, annotation, blocking, frame)
+    
+    def sequences_equal(self, left, right, window=3, annotation='', blocking=False):
+        
+        # Compares two iterables (e.g. generators streaming rows) item by item as they're produced,
+        # so only window items either side of the current one are held, stopping at the first
+        # difference.  Unlike comparing wrapped lists, neither side is gathered up first.
+        left_meta, right_meta = OperandMetadata.for_all(left, right)
+        left_description = left_meta.description if left_meta and left_meta.description else 'left'
+        right_description = right_meta.description if right_meta and right_meta.description else 'right'
+        left, right = OperandMetadata.real_operands(left, right)
+        equal_items, details = _sequence_difference(left, right, window)
+        components = [ComponentSnapshot('items equal', equal_items)]
+        self.record(details is None, Description('sequences_equal({}, {})', left_description, right_description),
+                    components, annotation, blocking, sys._getframe(1), details=details or ())
+        return details is None
+    
+    def buffers_equal(self, left, right, chunk_size=None, context=None, annotation='', blocking=False):
+        
+        # Compares two buffers (bytes, bytearrays, mmaps, ...) chunk by chunk without copying them,
+        # and reports the first differing offset with a hex dump around it.  See disclose.buffers.
+        from disclose.buffers import verify_buffers_equal
+        return verify_buffers_equal(self, left, right, chunk_size, context, annotation, blocking,
+                                    sys._getframe(1))
+    
+    def _eventually_outcome(self, predicate, result, error, attempts, elapsed, annotation, blocking, frame):
+        
+        summary = '{} attempt{} in {:.3f}s'.format(attempts, '' if attempts == 1 else 's', elapsed / 1e9)
+        annotation = annotation + '\n' + summary if annotation else summary
+        if error is not None:
+            return self.record(False, '{}() raised {!r}'.format(_callable_name(predicate), error), (),
+                               annotation, blocking, frame)
+        return self._verify(result, annotation, blocking, frame)
+    
+    def child(self, name):
+        
+        # A sub-session (e.g. for one scenario) with its own failures and counters, sharing this
+        # session's logger, sinks and settings.  This session is failing while any child is.
+        # Children are kept by name, so asking again for the same name gives the same child.
+        with self._lock:
+            child = self.children.get(name)
+            if child is None:
+                child = VerificationSession(self.message_formatter, self.block_handler, self.logger,
+                                            snapshot=self.snapshot, aggregate=self.aggregate)
+                if 'context_exit_handler' in self.__dict__:
+                    child.context_exit_handler = MethodType(self.context_exit_handler.__func__, child)
+                # The same list, so sinks added to the parent later get the child's records too
+                child.sinks = self.sinks
+                child.structured = self.structured
+                child.baseline = self.baseline
+                child.diff_limit = self.diff_limit
+                child.max_exemplars = self.max_exemplars
+                child.name = name
+                child.parent = self
+                self.children[name] = child
+        return child
+    
+    def _child_failing(self, change):
+        
+        # change is 1 when a child starts failing and -1 when it stops, which is passed on up only
+        # if it changes whether this session is failing too
+        with self._lock:
+            was_failing = bool(self.failures or self._failing_children)
+            self._failing_children += change
+            failing = bool(self.failures or self._failing_children)
+        if failing != was_failing and self.parent is not None:
+            self.parent._child_failing(change)
+    
+    def walk(self):
+        
+        # This session and all its descendants, parents before their children
+        yield self
+        for child in list(self.children.values()):
+            for session in child.walk():
+                yield session
+    
+    def reset(self):
+        
+        # Children are let go of, rather than reset, so they no longer count towards this session
+        with self._lock:
+            was_failing = bool(self.failures or self._failing_children)
+            self.failures = []
+            self.checks = 0
+            self.failure_groups = OrderedDict()
+            self.baseline_counts = dict.fromkeys(BASELINE_STATUSES, 0)
+            for child in self.children.values():
+                child.parent = None
+            self.children = OrderedDict()
+            self._failing_children = 0
+        if was_failing and self.parent is not None:
+            self.parent._child_failing(-1)
+    
+    def summary(self):
+        
+        # Every failure group of an aggregating session, most frequent first
+        groups = sorted(self.failure_groups.values(), key=lambda group: -group.count)
+        total = sum(group.count for group in groups)
+        lines = ['{} distinct failure{} ({} in total) in {} checks'.format(
+            len(groups), '' if len(groups) == 1 else 's', total, self.checks)]
+        lines.extend(group.summary() for group in groups)
+        return '\n'.join(lines)
+    
     def __nonzero__(self):
         
-        return not self.failures
+        return not (self.failures or self._failing_children)
+    
+    __bool__ = __nonzero__
     
     def __enter__(self):
         
@@ -104,45 +827,39 @@ class VerificationSession(object):
         return self.context_exit_handler(exc_type, exc_value, traceback)
 
 
+# Metadata is kept on the wrapper itself (out of reach of the wrapper's own attribute handling), so
+# it lives exactly as long as the wrapper does.
+META_ATTRIBUTE = '_disclose_meta'
+_get_attribute = object.__getattribute__
+_set_attribute = object.__setattr__
+
+
 class OperandMetadata(object):
     
-    _for = {}
-    
-    def __init__(self, operand, description, wrapper, components=None):
+    def __init__(self, operand, description, wrapper, components=None, policy=None, depth=0):
         
         self.operand = operand
         self.description = description
-        self.wrapper = wrapper
-        self.__class__._for[id(wrapper)] = self
+        _set_attribute(wrapper, META_ATTRIBUTE, self)
         self.components = components if components else []
+        # Set on the results of equality operations, to (left, right, left description)
+        self.compared = None
+        # The TrackingPolicy of the expression, if any, and the number of steps into it this is
+        self.policy = policy
+        self.depth = depth
     
-    @property
-    def wrapper(self):
-         
-        return self._wrapper()
-     
-    @wrapper.setter
-    def wrapper(self, value):
-        
-        def del_callback(wrapper):
-            
-            try:
-                del self.__class__._for[id(wrapper)]
-            except:
-                pass
+    @classmethod
+    def for_all(cls, *operands):
         
-        self._wrapper = ref(value, partial(del_callback, value))
+        return [cls.lookup(operand) for operand in operands]
     
     @classmethod
-    def for_all(cls, *operands):
+    def lookup(cls, operand):
         
-        out = []
-        for operand in operands:
-            try:
-                out.append(cls._for[id(operand)])
-            except (KeyError, TypeError):
-                out.append(None)
-        return out
+        # for_ without the exception when the operand isn't wrapped
+        if isinstance(operand, OperandWrapper):
+            return _get_attribute(operand, META_ATTRIBUTE)
+        return None
     
     @classmethod
     def real_operands(cls, *operands):
@@ -153,27 +870,122 @@ class OperandMetadata(object):
     @classmethod
     def for_(cls, operand):
         
-        #print 'retrieve %d' % id(operand)
-        meta = cls._for[id(operand)]
-        #print 'retrieval meta %d' % id(meta)
-        if meta.wrapper is operand:
-            return meta
-        else:
-            del cls._for[id(operand)]
+        meta = cls.lookup(operand)
+        if meta is None:
             raise KeyError(operand)
+        return meta
+
+
+class Description(object):
+    
+    # The description of an operation's result, rendered from a format template and the
+    # descriptions (or, lacking those, the values) of its operands the first time it's read.
+    # Expressions are mostly evaluated far more often than their descriptions are logged.
+    __slots__ = ('template', 'parts', 'named', 'text')
+    
+    def __init__(self, template, *parts, **named):
+        
+        self.template = template
+        self.parts = parts
+        self.named = named
+        self.text = None
+    
+    def render(self):
+        
+        text = self.text
+        if text is None:
+            # Sessions can be shared between threads, so another may render this at the same time.
+            # text is always set before the operands go, so if they've gone it's there to return.
+            parts, named = self.parts, self.named
+            if parts is None or named is None:
+                return self.text
+            # Operands are described by their str(), as format() would use __format__
+            parts = [_description_text(part) for part in parts]
+            named = dict((name, _description_text(part)) for name, part in named.items())
+            try:
+                text = self.template.format(*parts, **named)
+            except UnicodeError:
+                # Python 2 text in a byte string template
+                text = text_type(self.template).format(*parts, **named)
+            self.text = text
+            # Rendered once and for all, so the operands can go
+            self.parts = self.named = None
+        return text
+    
+    def __str__(self):
+        
+        return self.render()
+    
+    def __repr__(self):
+        
+        return repr(self.render())
+    
+    def __format__(self, spec):
+        
+        return format(self.render(), spec)
+    
+    def __add__(self, other):
+        
+        return self.render() + other
+    
+    def __radd__(self, other):
+        
+        return other + self.render()
+
+def _description_text(part):
+    
+    if isinstance(part, Description):
+        return part.render()
+    if isinstance(part, string_types):
+        return part
+    return str(part)
+
+def render_description(description):
+    
+    return description.render() if isinstance(description, Description) else description
 
+def description_template(description):
+    
+    # What identifies a verification along with its location (see FailureGroup and
+    # disclose.baseline): the whole description with only the undescribed values left as
+    # placeholders, so loop iterations share it, but different verifications made through one
+    # helper don't.  A description already rendered has given up its operands, so it's its text.
+    if not isinstance(description, Description):
+        return description
+    parts, named = description.parts, description.named
+    if parts is None or named is None:
+        return description.text
+    parts = [_template_part(part) for part in parts]
+    named = dict((name, _template_part(part)) for name, part in named.items())
+    try:
+        return description.template.format(*parts, **named)
+    except UnicodeError:
+        return text_type(description.template).format(*parts, **named)
+
+def _template_part(part):
+    
+    if isinstance(part, Description):
+        return description_template(part)
+    # The names of described operands, attributes and keys
+    if isinstance(part, string_types):
+        return part
+    return '{}'
 
 def description_helper(template, left_op, left_meta, right_op, right_meta):
     
     if left_meta and left_meta.description:
         left = left_meta.description
     else:
-        left = str(left_op)
+        left = left_op
     if right_meta and right_meta.description:
         right = right_meta.description
     else:
-        right = str(right_op)
-    return template.format(right=right, left=left)
+        right = right_op
+    return Description(template, right=right, left=left)
+
+def conversion_description(name, meta):
+    
+    return Description('{}({})', name, meta.description if meta.description else meta.operand)
 
 def binary_op_helper(description_template, left, right):
     
@@ -185,6 +997,145 @@ def binary_op_helper(description_template, left, right):
     return right_left, left_meta, right_real, right_meta, description
 
 
+def unwrap_call(function_description, args, kwargs, components):
+    
+    # One pass over the arguments of a call: returns the plain arguments and the call's
+    # description, and adds the metadata of wrapped arguments to components.
+    real_args = []
+    parts = [function_description]
+    for arg in args:
+        meta = OperandMetadata.lookup(arg)
+        if meta:
+            arg = meta.operand
+            components.extend(meta.components)
+            components.append(meta)
+            parts.append(meta.description or arg)
+        else:
+            parts.append(arg)
+        real_args.append(arg)
+    placeholders = ['{}'] * len(real_args)
+    real_kwargs = {}
+    for name, value in kwargs.items():
+        meta = OperandMetadata.lookup(value)
+        if meta:
+            value = meta.operand
+            components.extend(meta.components)
+            components.append(meta)
+            parts.append(meta.description or value)
+        else:
+            parts.append(value)
+        placeholders.append(name + '={}')
+        real_kwargs[name] = value
+    return real_args, real_kwargs, Description('{}(' + ', '.join(placeholders) + ')', *parts)
+
+def derived_operand(meta, value, description, components, name=None):
+    
+    # Wraps the result of an attribute access, item access (name is the attribute or key) or call
+    # (name is None) on meta's wrapper, as far as its tracking policy allows.
+    policy = meta.policy
+    if policy is None:
+        return OperandWrapper(value, description, components)
+    if name is None:
+        # Calls are as deep as what was called
+        if not policy.tracks_result(None, value):
+            return value
+        depth = meta.depth
+    else:
+        depth = meta.depth + 1
+        if not policy.tracks(name, value, depth):
+            return value
+    return tracked_operand(value, description, components, policy, depth)
+
+def tracked_operand(value, description, components, policy, depth):
+    
+    # OperandWrapper(..., policy=policy, depth=depth), without building keyword argument dicts
+    wrapper = OperandWrapper(value, description, components)
+    if DISABLED:
+        return wrapper
+    meta = _get_attribute(wrapper, META_ATTRIBUTE)
+    meta.policy = policy
+    meta.depth = depth
+    return wrapper
+
+
+# What passthrough_calls applies to; the same as inspect.isroutine, but cheaper
+ROUTINE_TYPES = (FunctionType, MethodType, BuiltinFunctionType, type(object.__init__), type(object().__init__),
+                 type(str.join))
+
+
+class TrackingPolicy(object):
+    
+    # Limits what is tracked from a wrapper, for wrapping heavyweight objects (e.g. service
+    # clients) where tracking every step costs too much:
+    #
+    #     client = OperandWrapper(client, 'client', policy=TrackingPolicy(attributes=['get_user', 'name']))
+    #
+    # Attribute access, item access and calls return plain values once they fall outside the
+    # policy.  attributes are the attribute names (and keys) to track, types the types of values
+    # to track whatever their name; with neither, everything is.  max_depth is the most steps
+    # tracked away from the original wrapper.  With passthrough_calls, methods aren't wrapped,
+    # only what calling them returns.
+    def __init__(self, attributes=None, types=None, max_depth=None, passthrough_calls=False):
+        
+        self.attributes = frozenset(attributes) if attributes is not None else None
+        self.types = tuple(types) if types is not None else None
+        self.max_depth = max_depth
+        self.passthrough_calls = passthrough_calls
+    
+    def tracks(self, name, value, depth):
+        
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        if self.attributes is None and self.types is None:
+            return True
+        return ((self.attributes is not None and isinstance(name, string_types) and name in self.attributes)
+                or (self.types is not None and isinstance(value, self.types)))
+    
+    def tracks_method(self, name, depth):
+        
+        # Methods are tracked by name, or in case they return one of the types
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        return self.attributes is None or self.types is not None or name in self.attributes
+    
+    def tracks_result(self, name, value):
+        
+        return (self.types is None or isinstance(value, self.types)
+                or (self.attributes is not None and name in self.attributes))
+
+
+class PassthroughCall(object):
+    
+    # Stands in for a method of a wrapper whose policy has passthrough_calls, so only the result
+    # of calling it is tracked
+    __slots__ = ('meta', 'name', 'function')
+    
+    def __init__(self, meta, name, function):
+        
+        self.meta = meta
+        self.name = name
+        self.function = function
+    
+    def __call__(self, *args, **kwargs):
+        
+        meta = self.meta
+        components = meta.components + [meta]
+        args, kwargs, description = unwrap_call(Description('{}.{}', meta.description, self.name), args, kwargs,
+                                                components)
+        result = self.function(*args, **kwargs)
+        if not meta.policy.tracks_result(self.name, result):
+            return result
+        return tracked_operand(result, description, components, meta.policy, meta.depth + 1)
+    
+    def __getattr__(self, name):
+        
+        return getattr(self.function, name)
+    
+    def __repr__(self):
+        
+        return repr(self.function)
+
+
 class OperandWrapperItertor(object):
     
     def __init__(self, operand, description, components=None):
@@ -202,23 +1153,41 @@ class OperandWrapperItertor(object):
     def next(self):
         
         self.counter += 1
-        next_value = OperandMetadata.real_operands(self.operand_iterator.next())[0]
-        if self.description:
-            description = self.description
-        else:
-            description = str(type(self.operand))
-        description += '[' + str(self.counter) + ']'
+        next_value = OperandMetadata.real_operands(next(self.operand_iterator))[0]
+        description = Description('{}[{}]', self.description if self.description else type(self.operand),
+                                  self.counter)
         return OperandWrapper(next_value, description, self.components)
+    
+    __next__ = next
 
 
 class OperandWrapper(object):
     
+    # Until __init__ sets it (see META_ATTRIBUTE)
+    _disclose_meta = None
+    
+    def __new__(cls, *args, **kwargs):
+        
+        if DISABLED and args:
+            # Not an instance of cls, so __init__ isn't called either
+            operand = args[0]
+            if isinstance(operand, OperandWrapper):
+                return _get_attribute(operand, META_ATTRIBUTE).operand
+            return operand
+        # Operands of common builtin types get a specialized wrapper
+        if cls is OperandWrapper and args:
+            meta = OperandMetadata.lookup(args[0])
+            operand = meta.operand if meta else args[0]
+            specialized = SPECIALIZED_WRAPPERS.get(type(operand))
+            if specialized:
+                return specialized.__new__(specialized, operand)
+        return object.__new__(cls)
+    
     def __init__(self, *args, **kwargs):
         
         # First call to __init__ on an instance creates it
-        try:
-            meta = OperandMetadata.for_(self)
-        except (KeyError, TypeError):
+        meta = OperandMetadata.lookup(self)
+        if meta is None:
             # Args composed of operand and description
             try:
                 operand, description = args[:2]
@@ -231,11 +1200,10 @@ class OperandWrapper(object):
                 description = operand.__class__.__name__
                 components = []
             # Attempt to unwrap the operand, so we don't nest wrappers
-            try:
-                operand = OperandMetadata.for_(operand).operand
-            except(KeyError, TypeError, AttributeError):
-                pass
-            OperandMetadata(operand, description, self, components)
+            operand_meta = OperandMetadata.lookup(operand)
+            if operand_meta:
+                operand = operand_meta.operand
+            OperandMetadata(operand, description, self, components, kwargs.get('policy'), kwargs.get('depth', 0))
         else:
             meta.operand.__init__(meta.operand, *args, **kwargs)
     
@@ -245,9 +1213,20 @@ class OperandWrapper(object):
         
         #print id(self)
         meta = OperandMetadata.for_(self)
-        description = meta.description + '.' + name
-        attr = OperandMetadata.real_operands(getattr(meta.operand, name))[0]
-        return OperandWrapper(attr, description, meta.components + [meta])
+        attr = getattr(meta.operand, name)
+        attr_meta = OperandMetadata.lookup(attr)
+        if attr_meta:
+            attr = attr_meta.operand
+        policy = meta.policy
+        if policy is not None and isinstance(attr, ROUTINE_TYPES):
+            if not policy.tracks_method(name, meta.depth + 1):
+                return attr
+            if policy.passthrough_calls:
+                return PassthroughCall(meta, name, attr)
+            return tracked_operand(attr, Description('{}.{}', meta.description, name), meta.components + [meta],
+                                   policy, meta.depth + 1)
+        description = Description('{}.{}', meta.description, name)
+        return derived_operand(meta, attr, description, meta.components + [meta], name)
     
     def __setattr__(self, name, value):
         
@@ -263,19 +1242,19 @@ class OperandWrapper(object):
     def __len__(self):
         
         meta = OperandMetadata.for_(self)
-        description = 'len(' + meta.description if meta.description else meta.operand + ')'
+        description = conversion_description('len', meta)
         length = len(meta.operand)
         return OperandWrapper(length, description, meta.components + [meta])
     
     def __getitem__(self, key):
         
         meta = OperandMetadata.for_(self)
-        if isinstance(key, basestring):
-            description = meta.description + "['" + key + "']"
+        if isinstance(key, string_types):
+            description = Description("{}['{}']", meta.description, key)
         else:
-            description = meta.description + '[' + str(key) + ']'
+            description = Description('{}[{}]', meta.description, key)
         attr = OperandMetadata.real_operands(meta.operand[key])[0]
-        return OperandWrapper(attr, description, meta.components + [meta])
+        return derived_operand(meta, attr, description, meta.components + [meta], key)
     
     def __setitem__(self, key, value):
         
@@ -303,15 +1282,15 @@ class OperandWrapper(object):
                 value_description = value_meta.operand
         else:
             value_real = value
-            value_description = str(value)
-        description = '' + value_description + ' in ' + meta.description if meta.description else meta.operand
+            value_description = value
+        description = Description('{} in {}', value_description, meta.description) if meta.description else meta.operand
         result = value_real in meta.operand
         return OperandWrapper(result, description, meta.components + [meta])
     
     def __reversed__(self):
         
         meta = OperandMetadata.for_(self)
-        description = 'reversed(' + meta.description if meta.description else meta.operand + ')'
+        description = conversion_description('reversed', meta)
         reversed_ = reversed(meta.operand)
         return OperandWrapper(reversed_, description, meta.components + [meta])
     
@@ -320,25 +1299,11 @@ class OperandWrapper(object):
     def __call__(self, *args, **kwargs):
         
         self_meta = OperandMetadata.for_(self)
-        self_real = self_meta.operand
-        args_real = OperandMetadata.real_operands(*args)
-        args_data = zip(args_real, OperandMetadata.for_all(*args))
-        args_components = list(itertools.chain(*[arg.components for arg, meta in args_data if meta]))
-        kwargs_names = []
-        kwargs_values = []
-        for name, value in kwargs.iteritems():
-            kwargs_names.append(name)
-            kwargs_values.append(value)
-        kwargs_real = OperandMetadata.real_operands(*kwargs_values)
-        kwargs_data = zip(kwargs_real, OperandMetadata.for_all(*kwargs_values))
-        kwargs_components = list(itertools.chain(*[kwarg.components for kwarg, meta in kwargs_data if meta]))
-        args_description = ', '.join(meta.description if meta and meta.description else str(real) for real, meta in args_data)
-        kwargs_description = ', '.join('{}={}'.format(name, meta.description if meta and meta.description else str(real))
-                                       for name, (real, meta) in zip(kwargs_names, kwargs_data))
-        description = (self_meta.description + '(' + args_description
-                       + (', ' if args_description and kwargs_description else '') + kwargs_description + ')')
-        result = self_real(*args_real, **dict(zip(kwargs_names, kwargs_real)))
-        return OperandWrapper(result, description, self_meta.components + args_components + kwargs_components + [self_meta])
+        components = list(self_meta.components)
+        args, kwargs, description = unwrap_call(self_meta.description, args, kwargs, components)
+        components.append(self_meta)
+        result = self_meta.operand(*args, **kwargs)
+        return derived_operand(self_meta, result, description, components)
     
     #### HASHING
     
@@ -421,6 +1386,17 @@ class OperandWrapper(object):
             metas.append(other_meta)
         return OperandWrapper(result_value, description, metas)
     
+    def __truediv__(self, other):
+        
+        self_real, self_meta, other_real, other_meta, description = binary_op_helper('({left}) / ({right})',
+                                                                                     self, other)
+        result_value = operator.truediv(self_real, other_real)
+        metas = self_meta.components + [self_meta]
+        if other_meta:
+            metas.extend(other_meta.components)
+            metas.append(other_meta)
+        return OperandWrapper(result_value, description, metas)
+    
     def __floordiv__(self, other):
         
         self_real, self_meta, other_real, other_meta, description = binary_op_helper('({left}) // ({right})',
@@ -436,7 +1412,7 @@ class OperandWrapper(object):
         
         self_real, self_meta, other_real, other_meta, description = binary_op_helper('({left}) % ({right})',
                                                                                      self, other)
-        result_value = self_real / other_real
+        result_value = self_real % other_real
         metas = self_meta.components + [self_meta]
         if other_meta:
             metas.extend(other_meta.components)
@@ -565,6 +1541,19 @@ class OperandWrapper(object):
         metas.append(self_meta)
         return OperandWrapper(result_value, description, metas)
     
+    def __rtruediv__(self, other):
+        
+        other_real, other_meta, self_real, self_meta, description = binary_op_helper('({left}) / ({right})',
+                                                                                     other, self)
+        result_value = operator.truediv(other_real, self_real)
+        metas = []
+        if other_meta:
+            metas.extend(other_meta.components)
+            metas.append(other_meta)
+        metas.extend(self_meta.components)
+        metas.append(self_meta)
+        return OperandWrapper(result_value, description, metas)
+    
     def __rfloordiv__(self, other):
         
         other_real, other_meta, self_real, self_meta, description = binary_op_helper('({left}) // ({right})',
@@ -682,7 +1671,11 @@ class OperandWrapper(object):
         if other_meta:
             metas.extend(other_meta.components)
             metas.append(other_meta)
-        return OperandWrapper(result_value, description, metas)
+        result = OperandWrapper(result_value, description, metas)
+        # Wrappers made before disable() still work, but give plain results
+        if not DISABLED:
+            OperandMetadata.for_(result).compared = (self_real, other_real, self_meta.description or self_real)
+        return result
     
     def __ne__(self, other):
         
@@ -758,6 +1751,10 @@ class OperandWrapper(object):
         
         return self / other
     
+    def __itruediv__(self, other):
+        
+        return operator.truediv(self, other)
+    
     def __ifloordiv__(self, other):
         
         return self // other
@@ -800,19 +1797,18 @@ class OperandWrapper(object):
         
         meta = OperandMetadata.for_(self)
         # __nonzero__ return value explicitly type checked for bool or int, so can't do what
-        # we want here...
+        # we want here...  (same goes for __len__; the interpreter converts whatever we return
+        # to a plain int.)
         return bool(meta.operand)
-#         description = 'bool(' + meta.description if meta.description else meta.operand + ')'
-#         return OperandWrapper(int(bool(meta.operand)), description)
+    
+    __bool__ = __nonzero__
     
     #### REPRESENTATION/CASTING
     
     def __str__(self):
         
-         meta = OperandMetadata.for_(self)
-         return str(meta.operand)
-#         description = 'str(' + meta.description if meta.description else meta.operand + ')'
-#         return StrOperandWrapper(str(meta.operand), description, meta.components + [meta])
+        meta = OperandMetadata.for_(self)
+        return StrOperandWrapper(str(meta.operand), conversion_description('str', meta), meta.components + [meta])
     
     def __repr__(self):
         
@@ -822,61 +1818,58 @@ class OperandWrapper(object):
     def __unicode__(self):
         
         meta = OperandMetadata.for_(self)
-        return unicode(meta.operand)
-#         description = 'unicode(' + meta.description if meta.description else meta.operand + ')'
-#         return UnicodeOperandWrapper(unicode(meta.operand), description, meta.components + [meta])
+        return UnicodeOperandWrapper(unicode(meta.operand), conversion_description('unicode', meta),
+                                     meta.components + [meta])
     
     def __format__(self, format_string):
         
         meta = OperandMetadata.for_(self)
-        return format_string.format(meta.operand)
-#         description = ('format(' + meta.description if meta.description else meta.operand + ','
-#                        + format_string)
-#         return OperandWrapper(format(meta.operand, format_string), description, meta.components + [meta])
+        return format(meta.operand, format_string)
     
     def __dir__(self):
         
         meta = OperandMetadata.for_(self)
-        description = 'dir(' + meta.description if meta.description else meta.operand + ')'
+        description = conversion_description('dir', meta)
         return OperandWrapper(dir(meta.operand), description, meta.components + [meta])
     
     def __int__(self):
         
         meta = OperandMetadata.for_(self)
-        return int(meta.operand)
-#         description = 'int(' + meta.description if meta.description else meta.operand + ')'
-#         return IntOperandWrapper(int(meta.operand), description, meta.components + [meta])
+        if not PY2:
+            # Python 3 deprecates (and strips) int subclasses returned from __int__
+            return int(meta.operand)
+        return IntOperandWrapper(int(meta.operand), conversion_description('int', meta), meta.components + [meta])
     
     def __long__(self):
         
         meta = OperandMetadata.for_(self)
-        return long(meta.operand)
-#         description = 'long(' + meta.description if meta.description else meta.operand + ')'
-#         return LongOperandWrapper(long(meta.operand), description, meta.components + [meta])
+        return LongOperandWrapper(long(meta.operand), conversion_description('long', meta), meta.components + [meta])
     
     def __float__(self):
         
         meta = OperandMetadata.for_(self)
-        return float(meta.operand)
-#         description = 'float(' + meta.description if meta.description else meta.operand + ')'
-#         return FloatOperandWrapper(float(meta.operand), description, meta.components + [meta])
+        if not PY2:
+            # As with __int__
+            return float(meta.operand)
+        return FloatOperandWrapper(float(meta.operand), conversion_description('float', meta),
+                                   meta.components + [meta])
     
     def __complex__(self):
         
         meta = OperandMetadata.for_(self)
-        description = 'complex(' + meta.description if meta.description else meta.operand + ')'
+        description = conversion_description('complex', meta)
         return OperandWrapper(complex(meta.operand), description, meta.components + [meta])
     
     def __oct__(self):
         
         meta = OperandMetadata.for_(self)
-        description = 'oct(' + meta.description if meta.description else meta.operand + ')'
+        description = conversion_description('oct', meta)
         return OperandWrapper(oct(meta.operand), description, meta.components + [meta])
     
     def __hex__(self):
         
         meta = OperandMetadata.for_(self)
-        description = 'hex(' + meta.description if meta.description else meta.operand + ')'
+        description = conversion_description('hex', meta)
         return OperandWrapper(hex(meta.operand), description, meta.components + [meta])
     
     def __index__(self):
@@ -886,7 +1879,7 @@ class OperandWrapper(object):
     def __trunc__(self):
         
         meta = OperandMetadata.for_(self)
-        description = 'math.trunc(' + meta.description if meta.description else meta.operand + ')'
+        description = conversion_description('math.trunc', meta)
         return OperandWrapper(math.trunc(meta.operand), description, meta.components + [meta])
     
     def __coerce__(self, other):
@@ -896,24 +1889,191 @@ class OperandWrapper(object):
         return meta.operand.__coerce__(other_real)
 
 
-# class OperandWrapperMetaclass(type):
-#     
-#     def __instancecheck__(cls, instance):
-#         
-#         return isinstance(instance, cls._proxy_for)
-#     
-#     def __subclasscheck__(cls, instance):
-#         
-#         return issubclass(instance, cls._proxy_for)
-# 
-# def _make(name, proxy_for):
-#     
-#     return OperandWrapperMetaclass(name, (OperandWrapper, proxy_for), {'_proxy_for' : proxy_for, '__class__' : proxy_for})
-# 
-# StrOperandWrapper = _make('StrOperandWrapper', str)
-# UnicodeOperandWrapper = _make('UnicodeOperandWrapper', unicode)
-# IntOperandWrapper = _make('IntOperandWrapper', int)
-# LongOperandWrapper = _make('LongOperandWrapper', long)
-# FloatOperandWrapper = _make('FloatOperandWrapper', float)
+#### SPECIALIZED WRAPPERS
+
+
+def fast_binary_op(description_template, operation, equality=False):
+    
+    # Equivalent to the generic operator methods, with one metadata lookup per operand and
+    # no intermediate lists.
+    def method(self, other):
+        
+        self_meta = OperandMetadata.for_(self)
+        other_meta = OperandMetadata.lookup(other)
+        metas = self_meta.components + [self_meta]
+        if other_meta:
+            other = other_meta.operand
+            other_description = other_meta.description or other
+            metas.extend(other_meta.components)
+            metas.append(other_meta)
+        else:
+            other_description = other
+        self_description = self_meta.description or self_meta.operand
+        description = Description(description_template, left=self_description, right=other_description)
+        result = OperandWrapper(operation(self_meta.operand, other), description, metas)
+        if equality and not DISABLED:
+            OperandMetadata.for_(result).compared = (self_meta.operand, other, self_description)
+        return result
+    return method
+
+def fast_reflected_binary_op(description_template, operation):
+    
+    def method(self, other):
+        
+        self_meta = OperandMetadata.for_(self)
+        other_meta = OperandMetadata.lookup(other)
+        metas = []
+        if other_meta:
+            other = other_meta.operand
+            other_description = other_meta.description or other
+            metas.extend(other_meta.components)
+            metas.append(other_meta)
+        else:
+            other_description = other
+        metas.extend(self_meta.components)
+        metas.append(self_meta)
+        description = Description(description_template, left=other_description,
+                                  right=self_meta.description or self_meta.operand)
+        return OperandWrapper(operation(other, self_meta.operand), description, metas)
+    return method
+
+
+class SpecializedOperandWrapper(OperandWrapper):
+    
+    __eq__ = fast_binary_op('({left}) == ({right})', operator.eq, True)
+    __ne__ = fast_binary_op('({left}) != ({right})', operator.ne)
+    __gt__ = fast_binary_op('({left}) > ({right})', operator.gt)
+    __ge__ = fast_binary_op('({left}) >= ({right})', operator.ge)
+    __lt__ = fast_binary_op('({left}) < ({right})', operator.lt)
+    __le__ = fast_binary_op('({left}) <= ({right})', operator.le)
+    __add__ = fast_binary_op('({left}) + ({right})', operator.add)
+    __sub__ = fast_binary_op('({left}) - ({right})', operator.sub)
+    __mul__ = fast_binary_op('({left}) * ({right})', operator.mul)
+    __truediv__ = fast_binary_op('({left}) / ({right})', operator.truediv)
+    __floordiv__ = fast_binary_op('({left}) // ({right})', operator.floordiv)
+    __mod__ = fast_binary_op('({left}) % ({right})', operator.mod)
+    __radd__ = fast_reflected_binary_op('({left}) + ({right})', operator.add)
+    __rsub__ = fast_reflected_binary_op('({left}) - ({right})', operator.sub)
+    __rmul__ = fast_reflected_binary_op('({left}) * ({right})', operator.mul)
+    __rtruediv__ = fast_reflected_binary_op('({left}) / ({right})', operator.truediv)
+    if PY2:
+        __div__ = fast_binary_op('({left}) / ({right})', operator.div)
+        __rdiv__ = fast_reflected_binary_op('({left}) / ({right})', operator.div)
+    __rfloordiv__ = fast_reflected_binary_op('({left}) // ({right})', operator.floordiv)
+    __rmod__ = fast_reflected_binary_op('({left}) % ({right})', operator.mod)
+    
+    __hash__ = OperandWrapper.__hash__
+
+
+def builtin_new(builtin):
+    
+    def __new__(cls, operand, *args, **kwargs):
+        
+        meta = OperandMetadata.lookup(operand)
+        return builtin.__new__(cls, meta.operand if meta else operand)
+    return __new__
+
+
+# Immutable builtins are wrapped by subclasses of the builtin holding a copy of the value, so they
+# can be passed anywhere the builtin can, and can be returned from conversions like __int__ and
+# __str__ without losing their metadata.
+
+class IntOperandWrapper(SpecializedOperandWrapper, int):
+    
+    __new__ = builtin_new(int)
+
+
+class FloatOperandWrapper(SpecializedOperandWrapper, float):
+    
+    __new__ = builtin_new(float)
+
+
+class StrOperandWrapper(SpecializedOperandWrapper, str):
+    
+    __new__ = builtin_new(str)
+
+
+if PY2:
+    
+    class LongOperandWrapper(SpecializedOperandWrapper, long):
+        
+        __new__ = builtin_new(long)
+    
+    
+    class UnicodeOperandWrapper(SpecializedOperandWrapper, unicode):
+        
+        __new__ = builtin_new(unicode)
+    
+    
+    BytesOperandWrapper = StrOperandWrapper
+else:
+    
+    class BytesOperandWrapper(SpecializedOperandWrapper, bytes):
+        
+        __new__ = builtin_new(bytes)
+    
+    
+    LongOperandWrapper = IntOperandWrapper
+    UnicodeOperandWrapper = StrOperandWrapper
+
+
+# Mutable containers have to stay proxies, but report the real class so isinstance checks pass
+# and get direct item access.
+
+class ContainerOperandWrapper(SpecializedOperandWrapper):
+    
+    def __getattribute__(self, name):
+        
+        if name == '__class__':
+            return OperandMetadata.for_(self).operand.__class__
+        return OperandWrapper.__getattribute__(self, name)
+    
+    def __getitem__(self, key):
+        
+        meta = OperandMetadata.for_(self)
+        metas = meta.components + [meta]
+        key_meta = OperandMetadata.lookup(key)
+        if key_meta:
+            key = key_meta.operand
+            metas.extend(key_meta.components)
+            metas.append(key_meta)
+            if key_meta.description:
+                description = Description('{}[{}]', meta.description, key_meta.description)
+            else:
+                description = Description('{}[{}]', meta.description, repr(key))
+        elif isinstance(key, string_types):
+            description = Description("{}['{}']", meta.description, key)
+        else:
+            description = Description('{}[{}]', meta.description, key)
+        value = meta.operand[key]
+        value_meta = OperandMetadata.lookup(value)
+        if value_meta:
+            value = value_meta.operand
+        return derived_operand(meta, value, description, metas, key)
+    
+    def __len__(self):
+        
+        return len(OperandMetadata.for_(self).operand)
+
+
+class ListOperandWrapper(ContainerOperandWrapper):
+    
+    pass
+
+
+class DictOperandWrapper(ContainerOperandWrapper):
+    
+    pass
+
+
+SPECIALIZED_WRAPPERS = {int: IntOperandWrapper,
+                        float: FloatOperandWrapper,
+                        str: StrOperandWrapper,
+                        bytes: BytesOperandWrapper,
+                        list: ListOperandWrapper,
+                        dict: DictOperandWrapper}
+if PY2:
+    SPECIALIZED_WRAPPERS.update({long: LongOperandWrapper,
+                                 unicode: UnicodeOperandWrapper})
 
 import disclose.patch_json
@@ -0,0 +1,32 @@
+# asyncio implementations of VerificationSession methods.  Kept apart from the
+# rest of the package since the syntax needs Python 3.5+.
+
+import asyncio
+import inspect
+
+from disclose import perf_counter_ns
+
+
+async def eventually(session, predicate, timeout, backoff, annotation, blocking, exceptions, frame):
+
+    delays = iter(backoff() if callable(backoff) else backoff)
+    start = perf_counter_ns()
+    deadline = start + int(timeout * 1e9)
+    attempts = 0
+    while True:
+        attempts += 1
+        error = None
+        try:
+            result = predicate()
+            if inspect.isawaitable(result):
+                result = await result
+        except exceptions as caught:
+            result, error = None, caught
+        if error is None and result:
+            break
+        remaining = (deadline - perf_counter_ns()) / 1e9
+        if remaining <= 0:
+            break
+        await asyncio.sleep(min(next(delays, remaining), remaining))
+    return session._eventually_outcome(predicate, result, error, attempts, perf_counter_ns() - start,
+                                       annotation, blocking, frame)
@@ -0,0 +1,32 @@
+# Names that differ between Python 2 and 3
+
+import sys
+
+PY2 = sys.version_info[0] == 2
+
+if PY2:
+    string_types = (basestring,)
+    text_type = unicode
+    integer_types = (int, long)
+    from itertools import izip
+
+    def iteritems(dictionary):
+
+        return dictionary.iteritems()
+
+    def viewkeys(dictionary):
+
+        return dictionary.viewkeys()
+else:
+    string_types = (str,)
+    text_type = str
+    integer_types = (int,)
+    izip = zip
+
+    def iteritems(dictionary):
+
+        return iter(dictionary.items())
+
+    def viewkeys(dictionary):
+
+        return dictionary.keys()
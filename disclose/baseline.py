@@ -0,0 +1,167 @@
+# Run to run comparison of verification outcomes.  A BaselineWriter sink
+# saves whether each verification (identified by its call site and the
+# template of its whole description, see disclose.description_template)
+# passed, and a session given the Baseline read back from that file
+# classifies every verification of the next run as it's made:
+#
+#     with BaselineWriter('baseline.new') as writer, Baseline('baseline') as baseline:
+#         verify = VerificationSession(sinks=[writer], baseline=baseline)
+#         ...
+#     verify.baseline_counts   # {'new failure': 3, 'fixed': 1, ...}
+#
+# The file is a hash table of 8 byte keys with open addressing, read through
+# mmap, so a lookup touches a slot or two of it and the rest is never loaded.
+
+from hashlib import md5
+import mmap
+import os
+import struct
+
+from disclose import NEW_CHECK, NEW_FAILURE, STILL_FAILING, FIXED, STILL_PASSING
+from disclose._compat import text_type
+
+
+MAGIC = b'DSCLBASE'
+# 2 from keys made with the whole description's template rather than its outermost one
+VERSION = 2
+# Magic, version, number of slots (a power of 2), number of entries
+HEADER = struct.Struct('<8sIQQ')
+# Key, then 1 if any verification with the key failed, otherwise 0
+SLOT = struct.Struct('<8sB')
+EMPTY_KEY = b'\0' * 8
+# Most entries per slot, keeping probe sequences short
+MAX_LOAD = 0.5
+
+_relative_paths = {}
+
+
+def _relative_path(filename):
+
+    # Keys use paths relative to the working directory where possible, so baselines from other
+    # checkouts still match.  Worked out once per file.
+    path = _relative_paths.get(filename)
+    if path is None:
+        path = os.path.abspath(filename)
+        relative = os.path.relpath(path)
+        if not relative.startswith(os.pardir):
+            path = relative
+        _relative_paths[filename] = path = path.replace(os.sep, '/')
+    return path
+
+
+def baseline_key(record):
+
+    filename, lineno, _ = record.location
+    template = record.template
+    if not isinstance(template, text_type):
+        template = template.decode('utf-8', 'replace') if isinstance(template, bytes) else text_type(template)
+    identity = u'{}\0{}\0{}'.format(_relative_path(filename), lineno, template)
+    key = md5(identity.encode('utf-8')).digest()[:8]
+    # The all zero key marks empty slots
+    return key if key != EMPTY_KEY else b'\0' * 7 + b'\1'
+
+
+def _slot_index(key, mask):
+
+    return struct.unpack('<Q', key)[0] & mask
+
+
+class BaselineWriter(object):
+
+    # Sink collecting the outcome of every distinct verification, written out to path on close.
+    # Memory grows with the number of distinct verifications, not with how often they're made.
+    def __init__(self, path):
+
+        self.path = path
+        self.failed = {}
+        self.closed = False
+
+    def __call__(self, record):
+
+        key = baseline_key(record)
+        if not record.passed:
+            self.failed[key] = True
+        elif key not in self.failed:
+            self.failed[key] = False
+
+    def close(self):
+
+        if self.closed:
+            return
+        self.closed = True
+        slots = 8
+        while slots * MAX_LOAD < len(self.failed):
+            slots *= 2
+        mask = slots - 1
+        table = bytearray(SLOT.size * slots)
+        for key, failed in self.failed.items():
+            index = _slot_index(key, mask)
+            while table[index * SLOT.size:index * SLOT.size + 8] != EMPTY_KEY:
+                index = (index + 1) & mask
+            SLOT.pack_into(table, index * SLOT.size, key, 1 if failed else 0)
+        # Written alongside and moved into place, so a reader never sees half a file, and a
+        # Baseline mapping the old file at the same path keeps working
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as output:
+            output.write(HEADER.pack(MAGIC, VERSION, slots, len(self.failed)))
+            output.write(table)
+        getattr(os, 'replace', os.rename)(temporary, self.path)
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+
+class Baseline(object):
+
+    def __init__(self, path):
+
+        with open(path, 'rb') as opened:
+            self.map = mmap.mmap(opened.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.slots, self.entries = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError('{} is not a disclose baseline (version {})'.format(path, VERSION))
+        self.mask = self.slots - 1
+
+    def failed(self, key):
+
+        # Whether the verification with key failed in the baseline, or None if it wasn't made
+        index = _slot_index(key, self.mask)
+        while True:
+            offset = HEADER.size + index * SLOT.size
+            slot_key = self.map[offset:offset + 8]
+            if slot_key == key:
+                return self.map[offset + 8:offset + 9] == b'\1'
+            if slot_key == EMPTY_KEY:
+                return None
+            index = (index + 1) & self.mask
+
+    def classify(self, record):
+
+        failed = self.failed(baseline_key(record))
+        if failed is None:
+            return NEW_CHECK
+        if record.passed:
+            return FIXED if failed else STILL_PASSING
+        return STILL_FAILING if failed else NEW_FAILURE
+
+    def __len__(self):
+
+        return self.entries
+
+    def close(self):
+
+        self.map.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
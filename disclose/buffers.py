@@ -0,0 +1,179 @@
+# Comparison of large binary payloads, e.g. files opened with mapped(), in
+# chunks of views onto the buffers, so nothing is copied and memory use stays
+# the same however big they are.  A failure reports the first differing
+# offset with a hex dump of the bytes around it, rather than the payloads:
+#
+#     with mapped('expected.bin') as expected, mapped('actual.bin') as actual:
+#         verify.buffers_equal(actual, expected)
+
+from contextlib import contextmanager
+import mmap
+import os
+
+from disclose._compat import PY2
+
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+# Bytes shown either side of the first difference
+DEFAULT_CONTEXT = 8
+
+
+class BufferComponent(object):
+
+    # Dumped in place of a buffer, which could be gigabytes long
+    __slots__ = ('description', 'operand')
+
+    def __init__(self, description, buffer):
+
+        self.description = 'len({})'.format(description)
+        self.operand = len(buffer)
+
+
+if PY2:
+    # buffer() and memoryview slices don't copy, and compare with memcmp()
+    def _view(data):
+
+        # Memoryviews of anything but bytes can't be cast to bytes here, so are copied
+        if isinstance(data, memoryview) and (data.itemsize != 1 or data.ndim != 1):
+            return data.tobytes()
+        return data
+
+    def _slice(view, start, stop):
+
+        if isinstance(view, memoryview):
+            return view[start:stop]
+        return buffer(view, start, stop - start)
+
+    def _release(view):
+
+        pass
+else:
+    def _view(data):
+
+        view = memoryview(data)
+        if view.format != 'B' or view.ndim != 1:
+            view = view.cast('B')
+        return view
+
+    def _slice(view, start, stop):
+
+        # Comparing memoryviews goes item by item, so bulk comparisons are done 8 bytes at a time
+        words = (stop - start) // 8 * 8
+        if not words:
+            return view[start:stop]
+        return _Words(view[start:start + words].cast('Q'), view[start + words:stop])
+
+    def _release(view):
+
+        view.release()
+
+
+class _Words(object):
+
+    # A slice viewed as 8 byte words and the odd bytes left over
+    __slots__ = ('words', 'rest')
+
+    def __init__(self, words, rest):
+
+        self.words = words
+        self.rest = rest
+
+    def __eq__(self, other):
+
+        return self.words == other.words and self.rest == other.rest
+
+    def __ne__(self, other):
+
+        return not self == other
+
+
+def first_difference(left, right, chunk_size=DEFAULT_CHUNK_SIZE):
+
+    # The offset of the first byte that differs between the buffers (or the length of the shorter
+    # if one starts with the other), or None if they're equal
+    left_view, right_view = _view(left), _view(right)
+    try:
+        length = min(len(left_view), len(right_view))
+        for start in range(0, length, chunk_size):
+            stop = min(start + chunk_size, length)
+            if _slice(left_view, start, stop) != _slice(right_view, start, stop):
+                return _bisect(left_view, right_view, start, stop)
+        if len(left_view) != len(right_view):
+            return length
+        return None
+    finally:
+        if left_view is not left:
+            _release(left_view)
+        if right_view is not right:
+            _release(right_view)
+
+
+def _bisect(left, right, start, stop):
+
+    # Narrows down a differing range to its first differing byte
+    while stop - start > 1:
+        middle = (start + stop) // 2
+        if _slice(left, start, middle) != _slice(right, start, middle):
+            stop = middle
+        else:
+            start = middle
+    return start
+
+
+def hex_dump(data, offset, start, context=DEFAULT_CONTEXT):
+
+    # One line of the bytes of data either side of offset, starting at the offset start
+    window = bytearray(data[start:offset + context + 1])
+    hex_bytes = ' '.join('{:02x}'.format(byte) for byte in window)
+    text = ''.join(chr(byte) if 32 <= byte < 127 else '.' for byte in window)
+    return '{:08x}: {} |{}|'.format(start, hex_bytes, text)
+
+
+def difference_details(left, right, offset, context=DEFAULT_CONTEXT, left_name='left', right_name='right'):
+
+    start = max(offset - context, 0)
+    if offset < min(len(left), len(right)):
+        summary = 'first difference at offset {} (0x{:x})'.format(offset, offset)
+    else:
+        summary = 'lengths differ ({} != {}), equal up to offset {} (0x{:x})'.format(len(left), len(right),
+                                                                                     offset, offset)
+    width = max(len(left_name), len(right_name))
+    left_line = '{} {}'.format(left_name.ljust(width), hex_dump(left, offset, start, context))
+    right_line = '{} {}'.format(right_name.ljust(width), hex_dump(right, offset, start, context))
+    # Points at the differing byte in the hex column
+    marker = ' ' * (width + 11 + 3 * (offset - start)) + '^^'
+    return [summary, left_line, right_line, marker]
+
+
+@contextmanager
+def mapped(path):
+
+    # The file at path, mapped read only.  Empty files can't be mapped, so give an empty buffer.
+    with open(path, 'rb') as opened:
+        if os.fstat(opened.fileno()).st_size == 0:
+            yield b''
+            return
+        buffer = mmap.mmap(opened.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield buffer
+        finally:
+            buffer.close()
+
+
+def verify_buffers_equal(session, left, right, chunk_size, context, annotation, blocking, frame):
+
+    from disclose import OperandMetadata, Description
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    context = DEFAULT_CONTEXT if context is None else context
+    left_meta, right_meta = OperandMetadata.for_all(left, right)
+    left_description = left_meta.description if left_meta and left_meta.description else 'left'
+    right_description = right_meta.description if right_meta and right_meta.description else 'right'
+    left, right = OperandMetadata.real_operands(left, right)
+    offset = first_difference(left, right, chunk_size)
+    details = ()
+    if offset is not None:
+        details = difference_details(left, right, offset, context, str(left_description), str(right_description))
+    components = [BufferComponent(left_description, left), BufferComponent(right_description, right)]
+    session.record(offset is None, Description('buffers_equal({}, {})', left_description, right_description),
+                   components, annotation, blocking, frame, details=details)
+    return offset is None
@@ -0,0 +1,246 @@
+# Structural diff of the operands of a failed equality verification.  Finds
+# the paths at which two (possibly nested) values differ, e.g.
+#
+#     resp['items'][42]['price']: 10 != 12
+#
+# Everything is generated lazily and cut off after a limit, and each step is
+# linear in the size of the containers involved, so it stays usable on
+# structures with millions of entries.
+
+import itertools
+
+from disclose._compat import text_type, izip, iteritems, viewkeys
+
+try:
+    from reprlib import Repr
+except ImportError:
+    from repr import Repr
+
+
+_repr = Repr()
+_repr.maxstring = 60
+_repr.maxother = 60
+_repr.maxlist = _repr.maxtuple = _repr.maxdict = _repr.maxset = 8
+short_repr = _repr.repr
+
+DEFAULT_LIMIT = 10
+# Largest number of insertions/deletions searched for when lining up sequences of different lengths
+DEFAULT_MAX_EDITS = 100
+
+
+STRUCTURED_TYPES = (dict, list, tuple, set, frozenset, text_type, bytes)
+CONTAINER_TYPES = (dict, list, tuple, set, frozenset)
+# Strings and sequences up to this long are plain enough in the operand dump
+SHORT_LENGTH = 8
+
+
+def is_structured(value):
+
+    # Only worth diffing these; anything else is just reported as left != right
+    return isinstance(value, STRUCTURED_TYPES)
+
+
+def worth_diffing(left, right):
+
+    # Whether the differences of two operands say more than their dump.  Only the operands
+    # themselves are checked: strings and sequences nested in them are always diffed.
+    if not (is_structured(left) and is_structured(right)):
+        return False
+    if isinstance(left, (dict, set, frozenset)) or isinstance(right, (dict, set, frozenset)):
+        return True
+    if len(left) > SHORT_LENGTH or len(right) > SHORT_LENGTH:
+        return True
+    if isinstance(left, (text_type, bytes)) or isinstance(right, (text_type, bytes)):
+        return False
+    return any(isinstance(item, CONTAINER_TYPES) for item in itertools.chain(left, right))
+
+
+def _line(template, *args):
+
+    try:
+        return template.format(*args)
+    except UnicodeError:
+        # Python 2 text (e.g. a description path) in a byte string template
+        return text_type(template).format(*args)
+
+
+def differences(left, right, path='', limit=DEFAULT_LIMIT, max_edits=DEFAULT_MAX_EDITS):
+
+    return list(itertools.islice(iter_differences(left, right, path, max_edits), limit))
+
+
+def iter_differences(left, right, path='', max_edits=DEFAULT_MAX_EDITS):
+
+    if left is right:
+        return
+    if isinstance(left, dict) and isinstance(right, dict):
+        differing = _mapping_differences(left, right, path, max_edits)
+    elif isinstance(left, (set, frozenset)) and isinstance(right, (set, frozenset)):
+        differing = _set_differences(left, right, path)
+    elif isinstance(left, (text_type, bytes)) and isinstance(right, (text_type, bytes)):
+        differing = _string_differences(left, right, path)
+    elif isinstance(left, (list, tuple)) and isinstance(right, (list, tuple)):
+        differing = _sequence_differences(left, right, path, max_edits)
+    else:
+        differing = None
+    if differing is None:
+        if left != right:
+            yield _line('{}: {} != {}', path, short_repr(left), short_repr(right))
+    else:
+        for difference in differing:
+            yield difference
+
+
+def _index_path(path, key):
+
+    return _line('{}[{}]', path, short_repr(key))
+
+
+def _mapping_differences(left, right, path, max_edits):
+
+    for key, value in iteritems(left):
+        if key not in right:
+            yield _line('{}: only in left ({})', _index_path(path, key), short_repr(value))
+        elif value != right[key]:
+            for difference in iter_differences(value, right[key], _index_path(path, key), max_edits):
+                yield difference
+    # Only the keys missing from the left need looking at, and the key set difference finds them at C speed
+    right_only = viewkeys(right) - viewkeys(left)
+    if right_only:
+        for key, value in iteritems(right):
+            if key in right_only:
+                yield _line('{}: only in right ({})', _index_path(path, key), short_repr(value))
+
+
+def _set_differences(left, right, path):
+
+    left_only = left - right
+    right_only = right - left
+    if left_only:
+        yield _line('{}: only in left {}', path, short_repr(left_only))
+    if right_only:
+        yield _line('{}: only in right {}', path, short_repr(right_only))
+
+
+def _common_affixes(left, right):
+
+    # Lengths of the common prefix and suffix, which never overlap
+    shortest = min(len(left), len(right))
+    start = 0
+    while start < shortest and left[start] == right[start]:
+        start += 1
+    end = 0
+    while end < shortest - start and left[-1 - end] == right[-1 - end]:
+        end += 1
+    return start, end
+
+
+def _string_differences(left, right, path):
+
+    if left == right:
+        return
+    if len(left) <= SHORT_LENGTH and len(right) <= SHORT_LENGTH:
+        yield _line('{}: {} != {}', path, short_repr(left), short_repr(right))
+        return
+    start, end = _common_affixes(left, right)
+    yield _line('{}[{}:{}]: {} != {}', path, start, len(left) - end, short_repr(left[start:len(left) - end]),
+                                     short_repr(right[start:len(right) - end]))
+
+
+def _sequence_differences(left, right, path, max_edits):
+
+    if len(left) == len(right):
+        for index, (left_item, right_item) in enumerate(izip(left, right)):
+            if left_item != right_item:
+                for difference in iter_differences(left_item, right_item, _index_path(path, index), max_edits):
+                    yield difference
+        return
+    start, end = _common_affixes(left, right)
+    left_middle = left[start:len(left) - end]
+    right_middle = right[start:len(right) - end]
+    edits = edit_script(left_middle, right_middle, max_edits)
+    if edits is None:
+        yield _line('{}: differ from index {} (lengths {} != {})', path, start, len(left), len(right))
+        return
+    for deleted, inserted in _hunks(edits):
+        # Items replaced one for one are reported as changes, and the rest as only on one side
+        for left_index, right_index in izip(deleted, inserted):
+            item_path = _index_path(path, start + left_index)
+            for difference in iter_differences(left_middle[left_index], right_middle[right_index], item_path,
+                                               max_edits):
+                yield difference
+        for left_index in deleted[len(inserted):]:
+            yield _line('{}: only in left ({})', _index_path(path, start + left_index),
+                        short_repr(left_middle[left_index]))
+        for right_index in inserted[len(deleted):]:
+            yield _line('{}: only in right ({})', _index_path(path, start + right_index),
+                        short_repr(right_middle[right_index]))
+
+
+def edit_script(left, right, max_edits=DEFAULT_MAX_EDITS):
+
+    # Myers' O((N + M)D) diff, giving up beyond max_edits.  Returns (operation, left_index, right_index)
+    # tuples, where operation is 'delete' (of left[left_index]) or 'insert' (of right[right_index]).
+    # Only the furthest reaching paths for each number of edits are kept, so space is O(D ** 2).
+    left_length, right_length = len(left), len(right)
+    furthest = {1: 0}
+    trace = []
+    for edits in range(max_edits + 1):
+        trace.append(dict(furthest))
+        for diagonal in range(-edits, edits + 1, 2):
+            if diagonal == -edits or (diagonal != edits and furthest[diagonal - 1] < furthest[diagonal + 1]):
+                x = furthest[diagonal + 1]
+            else:
+                x = furthest[diagonal - 1] + 1
+            y = x - diagonal
+            while x < left_length and y < right_length and left[x] == right[y]:
+                x += 1
+                y += 1
+            furthest[diagonal] = x
+            if x >= left_length and y >= right_length:
+                return _backtrack(trace, left_length, right_length)
+    return None
+
+
+def _backtrack(trace, x, y):
+
+    script = []
+    for edits in range(len(trace) - 1, 0, -1):
+        furthest = trace[edits]
+        diagonal = x - y
+        if diagonal == -edits or (diagonal != edits and furthest[diagonal - 1] < furthest[diagonal + 1]):
+            previous_diagonal = diagonal + 1
+        else:
+            previous_diagonal = diagonal - 1
+        previous_x = furthest[previous_diagonal]
+        previous_y = previous_x - previous_diagonal
+        # Skip back over the matching run, to the point the edit was made
+        while x > previous_x and y > previous_y:
+            x -= 1
+            y -= 1
+        if x == previous_x:
+            script.append(('insert', previous_x, previous_y))
+        else:
+            script.append(('delete', previous_x, previous_y))
+        x, y = previous_x, previous_y
+    script.reverse()
+    return script
+
+
+def _hunks(script):
+
+    # Groups edits with no matching items between them, as (deleted, inserted) index lists
+    deleted, inserted = [], []
+    position = None
+    for operation, x, y in script:
+        if position is not None and (x, y) != position:
+            yield deleted, inserted
+            deleted, inserted = [], []
+        if operation == 'delete':
+            deleted.append(x)
+            position = (x + 1, y)
+        else:
+            inserted.append(y)
+            position = (x, y + 1)
+    if deleted or inserted:
+        yield deleted, inserted
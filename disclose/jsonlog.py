@@ -0,0 +1,118 @@
+# Logging formatter writing records as lines of JSON, for log aggregators.
+# Verifications logged by a VerificationSession(structured=True) become
+# fields, rather than text to be parsed back apart:
+#
+#     handler = logging.StreamHandler()
+#     handler.setFormatter(JSONFormatter())
+#     logging.getLogger('test.validation').addHandler(handler)
+#     verify = VerificationSession(structured=True)
+#
+# gives lines like
+#
+#     {"time": 1700000000.0, "level": "ERROR", "logger": "test.validation",
+#      "verification": {"passed": false, "description": "(x) == (4)", "annotation": "",
+#                       "file": "test_x.py", "line": 12, "function": "test_x",
+#                       "components": [{"description": "x", "value": 3}], "details": [], "stack": [...]}}
+#
+# Nothing is worked out until a record is formatted, so verifications logged
+# at levels no handler takes cost next to nothing.
+
+import json
+import logging
+
+from disclose import OperandMetadata, render_description
+from disclose._compat import text_type, integer_types
+
+try:
+    # disclose.patch_json turns json over to a pure Python encoder, to see through wrappers.  The
+    # values here are plain, so they can go through the C one.
+    from _json import make_encoder as c_make_encoder, encode_basestring_ascii
+except ImportError:
+    c_make_encoder = None
+
+
+JSON_TYPES = (type(None), bool, float, text_type) + integer_types
+
+
+def json_value(value, max_length=200):
+
+    # Plain JSON values are kept as they are, and anything else becomes its text, cut short.  Types
+    # are checked exactly, as subclasses (e.g. wrappers) may not serialize as their base.
+    if type(value) in JSON_TYPES:
+        return value
+    meta = OperandMetadata.lookup(value)
+    if meta is not None:
+        value = meta.operand
+        if type(value) in JSON_TYPES:
+            return value
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'replace')
+    else:
+        try:
+            value = text_type(value)
+        except Exception as error:
+            value = u'<str() failed: {}>'.format(error.__class__.__name__)
+    if len(value) > max_length:
+        value = value[:max_length - 3] + u'...'
+    return value
+
+
+def verification_fields(record, max_length=200):
+
+    # The fields of a VerificationRecord, as JSON values
+    filename, lineno, function = record.location
+    fields = {'passed': record.passed,
+              'result': json_value(record.result, max_length),
+              'description': json_value(render_description(record.description), max_length),
+              'annotation': json_value(record.annotation, max_length),
+              'file': filename,
+              'line': lineno,
+              'function': function,
+              'components': [{'description': json_value(render_description(component.description), max_length),
+                              'value': json_value(component.operand, max_length)}
+                             for component in record.components],
+              'details': [json_value(detail, max_length) for detail in record.details]}
+    if record.baseline_status is not None:
+        fields['baseline'] = record.baseline_status
+    if record.stack is not None:
+        fields['stack'] = [{'file': filename, 'line': lineno, 'function': function}
+                           for filename, lineno, function in record.stack]
+    return fields
+
+
+class JSONFormatter(logging.Formatter):
+
+    # max_length is the longest text any value is cut to.  With message, the text message of
+    # verification records is included too, which takes formatting it.
+    def __init__(self, max_length=200, message=False):
+
+        logging.Formatter.__init__(self)
+        self.max_length = max_length
+        self.message = message
+        self._encode = None
+        if c_make_encoder is not None:
+            self._encode = c_make_encoder(None, self._not_serializable, encode_basestring_ascii, None, ': ', ', ',
+                                          True, False, True)
+
+    @staticmethod
+    def _not_serializable(value):
+
+        raise TypeError('{!r} is not JSON serializable'.format(value))
+
+    def encode(self, data):
+
+        if self._encode is None:
+            return json.dumps(data, sort_keys=True, default=self._not_serializable)
+        return ''.join(self._encode(data, 0))
+
+    def format(self, record):
+
+        data = {'time': record.created, 'level': record.levelname, 'logger': record.name}
+        verification = getattr(record, 'verification', None)
+        if verification is None or self.message:
+            data['message'] = record.getMessage()
+        if verification is not None:
+            data['verification'] = verification_fields(verification, self.max_length)
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return self.encode(data)
@@ -1,4 +1,5 @@
 from disclose import OperandMetadata
+from disclose._compat import PY2, string_types, integer_types, iteritems
 import json.encoder
  
 original_encode = json.encoder.JSONEncoder.encode
@@ -33,31 +34,35 @@ class ObjectWrapperAwareJSONEncoder(json.encoder.JSONEncoder):
         except:
             super(ObjectWrapperAwareJSONEncoder, self).default(o)
 
-json._default_encoder = ObjectWrapperAwareJSONEncoder(
+_default_encoder_options = dict(
     skipkeys=False,
     ensure_ascii=True,
     check_circular=True,
     allow_nan=True,
     indent=None,
     separators=None,
-    encoding='utf-8',
     default=None,
 )
+# Python 3 encoders only deal in text
+if PY2:
+    _default_encoder_options['encoding'] = 'utf-8'
+json._default_encoder = ObjectWrapperAwareJSONEncoder(**_default_encoder_options)
 
 
-# Copied directly from json.encode to parch in key conversion logic
+# Copied directly from json.encode (names that differ between Python 2 and 3 swapped for their
+# disclose._compat equivalents) to parch in key conversion logic
 def _make_iterencode(markers, _default, _encoder, _indent, _floatstr,
         _key_separator, _item_separator, _sort_keys, _skipkeys, _one_shot,
         ## HACK: hand-optimized bytecode; turn globals into locals
         ValueError=ValueError,
-        basestring=basestring,
+        basestring=string_types,
         dict=dict,
         float=float,
         id=id,
         int=int,
         isinstance=isinstance,
         list=list,
-        long=long,
+        integer_types=integer_types,
         str=str,
         tuple=tuple,
     ):
@@ -94,7 +99,7 @@ def _make_iterencode(markers, _default, _encoder, _indent, _floatstr,
                 yield buf + 'true'
             elif value is False:
                 yield buf + 'false'
-            elif isinstance(value, (int, long)):
+            elif isinstance(value, integer_types):
                 yield buf + str(value)
             elif isinstance(value, float):
                 yield buf + _floatstr(value)
@@ -137,7 +142,7 @@ def _make_iterencode(markers, _default, _encoder, _indent, _floatstr,
         if _sort_keys:
             items = sorted(dct.items(), key=lambda kv: kv[0])
         else:
-            items = dct.iteritems()
+            items = iteritems(dct)
         for key, value in items:
             # PATCHED HERE to unwrap values being used as keys
             try:
@@ -157,7 +162,7 @@ def _make_iterencode(markers, _default, _encoder, _indent, _floatstr,
                 key = 'false'
             elif key is None:
                 key = 'null'
-            elif isinstance(key, (int, long)):
+            elif isinstance(key, integer_types):
                 key = str(key)
             elif _skipkeys:
                 continue
@@ -177,7 +182,7 @@ def _make_iterencode(markers, _default, _encoder, _indent, _floatstr,
                 yield 'true'
             elif value is False:
                 yield 'false'
-            elif isinstance(value, (int, long)):
+            elif isinstance(value, integer_types):
                 yield str(value)
             elif isinstance(value, float):
                 yield _floatstr(value)
@@ -206,7 +211,7 @@ def _make_iterencode(markers, _default, _encoder, _indent, _floatstr,
             yield 'true'
         elif o is False:
             yield 'false'
-        elif isinstance(o, (int, long)):
+        elif isinstance(o, integer_types):
             yield str(o)
         elif isinstance(o, float):
             yield _floatstr(o)
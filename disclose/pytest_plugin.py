@@ -0,0 +1,60 @@
+# pytest plugin behind the `verify` fixture, which pytest_disclose (the pytest11
+# entry point) registers when a test first asks for it.  Passing
+# -p disclose.pytest_plugin registers it up front instead.
+#
+#     def test_thing(verify):
+#         verify(thing.x == 4)
+#
+# The test fails if any verification failed, with the failures attached to
+# the report.  One session is kept per pytest process and reset for each test,
+# so the fixture costs next to nothing and works the same under xdist.
+
+import pytest
+from disclose import VerificationSession
+from disclose.report import format_failure
+from pytest_disclose import PLUGIN_NAME, verify
+
+
+SECTION_NAME = 'disclose verifications'
+
+
+class DisclosePlugin(object):
+
+    def __init__(self):
+
+        self.session = VerificationSession()
+        self.item = None
+
+    def start(self, item):
+
+        self.session.reset()
+        self.item = item
+        return self.session
+
+    def finish(self):
+
+        self.item = None
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item, call):
+
+        outcome = yield
+        if call.when != 'call' or item is not self.item or self.session:
+            return
+        report = outcome.get_result()
+        # Including those of any sub-sessions made with verify.child()
+        sessions = list(self.session.walk())
+        failures = [record for session in sessions for record in session.failures]
+        # Only strings go on the report, so it survives being sent back from xdist workers.
+        text = u'\n\n'.join(format_failure(record) for record in failures)
+        report.sections.append((SECTION_NAME, text))
+        if report.passed:
+            report.outcome = 'failed'
+            checks = sum(session.checks for session in sessions)
+            report.longrepr = u'{} of {} verifications failed\n\n{}'.format(len(failures), checks, text)
+
+
+def pytest_configure(config):
+
+    if not config.pluginmanager.has_plugin(PLUGIN_NAME):
+        config.pluginmanager.register(DisclosePlugin(), PLUGIN_NAME)
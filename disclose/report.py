@@ -0,0 +1,191 @@
+# Report writers that stream VerificationSession records to disk.  Writers are
+# sinks: pass them to a session and every verification is written out as it
+# happens, so nothing but a couple of counters is held in memory.
+#
+#     with JUnitXMLReport('results.xml') as junit:
+#         verify = VerificationSession(sinks=[junit])
+#         ...
+
+from xml.sax.saxutils import escape, quoteattr
+import io
+import os
+import re
+
+from disclose._compat import text_type
+
+
+# Characters XML 1.0 doesn't allow, even escaped
+_INVALID_XML = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _text(value):
+
+    if not isinstance(value, (bytes, text_type)):
+        value = str(value)
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'replace')
+    return _INVALID_XML.sub(u'\ufffd', value)
+
+
+class StreamingReport(object):
+
+    def __init__(self, target, name='disclose'):
+
+        # target is a path, or a file to write to.  Text streams (e.g. sys.stdout on Python 3, or
+        # an io.StringIO) are written text; anything else is written UTF-8 bytes.
+        if hasattr(target, 'write'):
+            self.file = target
+            self._owns_file = False
+        else:
+            self.file = open(target, 'wb')
+            self._owns_file = True
+        self._text = isinstance(self.file, io.TextIOBase)
+        self.name = name
+        self.tests = 0
+        self.failures = 0
+        self.closed = False
+        self.write_header()
+
+    def write(self, text):
+
+        self.file.write(text if self._text else text.encode('utf-8'))
+
+    def reserve(self, width):
+
+        # Leaves space for text only known once the report is finished (e.g. totals), which
+        # is filled in by patch().  Returns None when the target can't seek back to it.
+        try:
+            offset = self.file.tell()
+        except (AttributeError, IOError, OSError):
+            return None
+        self.write(u' ' * width)
+        return offset, width
+
+    def patch(self, reservation, text):
+
+        if reservation is None:
+            return
+        offset, width = reservation
+        end = self.file.tell()
+        self.file.seek(offset)
+        self.write(text[:width].ljust(width))
+        self.file.seek(end)
+
+    def __call__(self, record):
+
+        self.tests += 1
+        if not record.passed:
+            self.failures += 1
+        self.write_record(record)
+
+    def close(self):
+
+        if self.closed:
+            return
+        self.closed = True
+        self.write_footer()
+        if self._owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+    def write_header(self):
+
+        raise NotImplementedError
+
+    def write_record(self, record):
+
+        raise NotImplementedError
+
+    def write_footer(self):
+
+        raise NotImplementedError
+
+
+def format_failure(record):
+
+    lines = []
+    if record.annotation:
+        lines.append(_text(record.annotation))
+    lines.append(_text(record.description))
+    lines.extend(_text(dump_value) for dump_value in record.dump_values())
+    if record.details:
+        lines.append(u'Differences:')
+        lines.extend(_text(detail) for detail in record.details)
+    lines.append(_text(record.format_stack()))
+    return u'\n'.join(lines)
+
+
+class JUnitXMLReport(StreamingReport):
+
+    # Plenty for the totals of any realistic session
+    TOTALS_WIDTH = 64
+
+    def write_header(self):
+
+        self.write(u'<?xml version="1.0" encoding="utf-8"?>\n')
+        self.write(u'<testsuite name=' + quoteattr(_text(self.name)))
+        self.totals = self.reserve(self.TOTALS_WIDTH)
+        self.write(u'>\n')
+
+    def write_record(self, record):
+
+        filename, lineno, function = record.location
+        classname = os.path.splitext(os.path.basename(filename))[0] + '.' + function
+        name = _text(record.description).split(u'\n', 1)[0]
+        self.write(u'  <testcase classname={} name={} file={} line="{}"'.format(
+            quoteattr(_text(classname)), quoteattr(name), quoteattr(_text(filename)), lineno))
+        if record.passed:
+            self.write(u'/>\n')
+        else:
+            message = _text(record.annotation) if record.annotation else u'Verification failed'
+            self.write(u'>\n    <failure type="VerificationFailure" message={}>{}</failure>\n  </testcase>\n'.format(
+                quoteattr(message), escape(format_failure(record))))
+
+    def write_footer(self):
+
+        self.write(u'</testsuite>\n')
+        self.patch(self.totals, u' tests="{}" failures="{}" errors="0" skipped="0"'.format(self.tests,
+                                                                                           self.failures))
+
+
+class HTMLReport(StreamingReport):
+
+    SUMMARY_WIDTH = 128
+    STYLE = (u'body{font-family:sans-serif;margin:2em}'
+             u'table{border-collapse:collapse;width:100%}'
+             u'td,th{border:1px solid #ccc;padding:4px 8px;text-align:left;vertical-align:top}'
+             u'tr.passed td.result{color:#2a7d2a}tr.failed td.result{color:#b22222;font-weight:bold}'
+             u'pre{margin:0;white-space:pre-wrap}')
+
+    def write_header(self):
+
+        title = escape(_text(self.name))
+        self.write(u'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{}</title>'
+                   u'<style>{}</style></head>\n<body><h1>{}</h1>\n<p>'.format(title, self.STYLE, title))
+        self.summary = self.reserve(self.SUMMARY_WIDTH)
+        self.write(u'</p>\n<table><tr><th>Result</th><th>Verification</th><th>Location</th></tr>\n')
+
+    def write_record(self, record):
+
+        filename, lineno, function = record.location
+        if record.passed:
+            result, detail = u'PASSED', escape(_text(record.description))
+        else:
+            result, detail = u'FAILED', escape(format_failure(record))
+        self.write(u'<tr class="{}"><td class="result">{}</td><td><pre>{}</pre></td><td>{}:{} in {}</td></tr>\n'.format(
+            result.lower(), result, detail, escape(_text(filename)), lineno, escape(_text(function))))
+
+    def write_footer(self):
+
+        self.write(u'</table>\n</body></html>\n')
+        self.patch(self.summary, u'{} verifications, {} passed, {} failed'.format(
+            self.tests, self.tests - self.failures, self.failures))
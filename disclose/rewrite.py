@@ -0,0 +1,648 @@
+# Import hook that rewrites verify(<expr>) calls in test modules so the
+# sub-expressions of <expr> are captured as they are evaluated, giving
+# VerificationSession the same descriptions and value dumps OperandWrapper
+# provides, without wrapping anything at runtime.
+#
+#     import disclose.rewrite
+#     disclose.rewrite.install()
+#     import test_things    # verify(...) calls in test_things are rewritten
+
+from disclose import VerificationSession, OperandMetadata, Description, is_disabled
+from disclose._compat import PY2
+import ast
+from hashlib import md5
+import marshal
+import os
+import struct
+import sys
+from fnmatch import fnmatch
+
+if PY2:
+    import imp
+    MAGIC = imp.get_magic()
+else:
+    from importlib.machinery import PathFinder, SourceFileLoader
+    from importlib.util import MAGIC_NUMBER as MAGIC
+
+
+# Bump whenever the generated code changes, so stale cache entries are ignored.
+REWRITE_VERSION = 4
+CACHE_TAG = 'disclose-%d-py%d%d' % ((REWRITE_VERSION,) + tuple(sys.version_info[:2]))
+
+DEFAULT_PATTERNS = ('test_*.py', '*_test.py')
+DEFAULT_NAMES = ('verify',)
+
+HELPER_NAME = '@disclose_rewrite'
+CAPTURE_NAME = '@capture'
+
+BINARY_OPERATORS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.FloorDiv: '//',
+                    ast.Mod: '%', ast.Pow: '**', ast.LShift: '<<', ast.RShift: '>>',
+                    ast.BitAnd: '&', ast.BitOr: '|', ast.BitXor: '^'}
+UNARY_OPERATORS = {ast.Not: 'not ', ast.USub: '-', ast.UAdd: '+', ast.Invert: '~'}
+COMPARISON_OPERATORS = {ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>',
+                        ast.GtE: '>=', ast.Is: 'is', ast.IsNot: 'is not', ast.In: 'in',
+                        ast.NotIn: 'not in'}
+LITERAL_NAMES = ('True', 'False', 'None')
+# Sub-expressions that behave differently inside the lambda the expression is moved into
+SCOPE_SENSITIVE_NODES = tuple(getattr(ast, name) for name in ('Yield', 'YieldFrom', 'Await', 'NamedExpr')
+                              if hasattr(ast, name))
+INDEX_NODES = getattr(ast, 'Index', ())
+# verify(*args) on Python 3, where there is no single expression to move into a lambda
+STARRED_NODES = getattr(ast, 'Starred', ())
+
+
+#### RUNTIME SUPPORT
+
+
+class CapturedOperand(object):
+
+    __slots__ = ('description', 'operand')
+
+    def __init__(self, description, operand):
+
+        self.description = description
+        self.operand = operand
+
+
+class Recorder(object):
+
+    def __init__(self, site):
+
+        self.description, self.components, self.opaque, count, self.equality = site
+        self.values = [Recorder] * count
+
+    def capture(self, index, value):
+
+        self.values[index] = value
+        return value
+
+    def slots(self):
+
+        # Only opaque sub-expressions (ones the rewriter couldn't describe statically) have
+        # placeholders in the templates; their text is the str() of their value, the same as
+        # unwrapped operands get from OperandWrapper.
+        slots = [''] * len(self.values)
+        for index in self.opaque:
+            value = self.values[index]
+            slots[index] = '?' if value is Recorder else str(value)
+        return slots
+
+    def render(self, template):
+
+        return template.format(*self.slots())
+
+    def describe(self, template):
+
+        # render, put off until the description is read, keeping the template
+        return Description(template, *self.slots())
+
+    def captured_components(self):
+
+        out = []
+        for template, index in self.components:
+            value = self.values[index]
+            # Short circuited sub-expressions are never evaluated, so there is nothing to dump
+            if value is not Recorder:
+                out.append(CapturedOperand(self.render(template), value))
+        return out
+
+
+    def compared(self):
+
+        if self.equality is None:
+            return None
+        left_index, right_index, left_template = self.equality
+        return self.values[left_index], self.values[right_index], self.render(left_template)
+
+
+def passthrough(index, value):
+
+    return value
+
+
+def _verify_arguments(annotation='', blocking=False, frame=None):
+
+    return annotation, blocking, frame
+
+
+def call(session, evaluate, site, *args, **kwargs):
+
+    # verify is just a name at rewrite time, so anything that isn't a session is called
+    # with the plain value of the expression.
+    if not isinstance(session, VerificationSession):
+        return session(evaluate(passthrough), *args, **kwargs)
+    kwargs['frame'] = sys._getframe(1)
+    if is_disabled():
+        return session.count(evaluate(passthrough), *args, **kwargs)
+    recorder = Recorder(site)
+    result = evaluate(recorder.capture)
+    if OperandMetadata.for_all(result)[0]:
+        # Wrapped operands already carry better descriptions than we can build here.  Going through
+        # _verify rather than the session itself, so the verification is located at the caller.
+        return session._verify(result, *_verify_arguments(*args, **kwargs))
+    kwargs['compared'] = recorder.compared()
+    # The template of the whole expression, with placeholders for opaque sub-expressions only
+    kwargs['template'] = recorder.description
+    return session.record(result, recorder.describe(recorder.description),
+                          recorder.captured_components(), *args, **kwargs)
+
+
+#### AST REWRITING
+
+
+def escape(text):
+
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+def parenthesize(template):
+
+    return '(' + template + ')'
+
+
+class ExpressionCapture(object):
+
+    def __init__(self):
+
+        self.count = 0
+        self.components = []
+        self.opaque = []
+        self.equality = None
+
+    def capture(self, node, template, component=True):
+
+        index = self.count
+        self.count += 1
+        if component:
+            self.components.append((template, index))
+        new_node = _call(ast.Name(CAPTURE_NAME, ast.Load()), [_constant(index), node])
+        return ast.copy_location(new_node, node), template
+
+    def opaque_node(self, node):
+
+        new_node, template = self.capture(node, '', False)
+        self.opaque.append(self.count - 1)
+        return new_node, '{' + str(self.count - 1) + '}'
+
+    def visit(self, node):
+
+        method = getattr(self, 'visit_' + node.__class__.__name__, None)
+        if method is None:
+            return self.opaque_node(node)
+        return method(node)
+
+    def is_capture(self, new_node, node):
+
+        return (isinstance(new_node, ast.Call) and getattr(new_node.func, 'id', None) == CAPTURE_NAME
+                and new_node.args[1] is node)
+
+    def visit_root(self, node):
+
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.ops[0], ast.Eq):
+            return self.visit_equality(node)
+        new_node, template = self.visit(node)
+        # The value of the whole expression is the result being verified, so it isn't dumped.
+        if (self.is_capture(new_node, node) and self.components
+                and self.components[-1][1] == _constant_value(new_node.args[0])):
+            self.components.pop()
+        return new_node, template
+
+    def visit_equality(self, node):
+
+        # Both sides are always captured (literals too), so a failure can be diffed
+        operands = []
+        for operand in (node.left, node.comparators[0]):
+            new_node, template = self.visit(operand)
+            if not self.is_capture(new_node, operand):
+                new_node, template = self.capture(new_node, template, False)
+            operands.append((new_node, template))
+        (node.left, left), (node.comparators[0], right) = operands
+        self.equality = (_constant_value(node.left.args[0]), _constant_value(node.comparators[0].args[0]), left)
+        return node, parenthesize(left) + ' == ' + parenthesize(right)
+
+    def visit_Num(self, node):
+
+        return node, escape(str(node.n))
+
+    def visit_Str(self, node):
+
+        return node, escape(_string_literal(node))
+
+    def visit_Constant(self, node):
+
+        # Every literal is a Constant from Python 3.8
+        value = node.value
+        if isinstance(value, str):
+            return node, escape(value)
+        if isinstance(value, bytes):
+            return node, escape(repr(value))
+        return node, escape(str(value))
+
+    def visit_NameConstant(self, node):
+
+        return node, str(node.value)
+
+    def visit_Name(self, node):
+
+        if node.id in LITERAL_NAMES:
+            return node, node.id
+        return self.capture(node, node.id)
+
+    def visit_Attribute(self, node):
+
+        node.value, template = self.visit(node.value)
+        return self.capture(node, template + '.' + node.attr)
+
+    def visit_Subscript(self, node):
+
+        # Plain keys are wrapped in an Index before Python 3.9, and are the slice itself after
+        if isinstance(node.slice, INDEX_NODES):
+            holder, field = node.slice, 'value'
+        elif isinstance(node.slice, ast.expr) and not isinstance(node.slice, (ast.Slice, ast.Tuple)):
+            holder, field = node, 'slice'
+        else:
+            return self.opaque_node(node)
+        node.value, template = self.visit(node.value)
+        key = getattr(holder, field)
+        key_string = _string_literal(key)
+        if key_string is not None:
+            template += "['" + escape(key_string) + "']"
+        else:
+            new_key, key_template = self.visit(key)
+            setattr(holder, field, new_key)
+            template += '[' + key_template + ']'
+        return self.capture(node, template)
+
+    def visit_Call(self, node):
+
+        if isinstance(node.func, ast.Name):
+            func_template = node.func.id
+        elif isinstance(node.func, ast.Attribute):
+            # Dumping bound methods is just noise, so only the object they're bound to is captured.
+            node.func.value, func_template = self.visit(node.func.value)
+            func_template += '.' + node.func.attr
+        else:
+            node.func, func_template = self.visit(node.func)
+        arg_templates = []
+        for index, arg in enumerate(node.args):
+            node.args[index], arg_template = self.visit(arg)
+            arg_templates.append(arg_template)
+        for keyword in node.keywords:
+            keyword.value, arg_template = self.visit(keyword.value)
+            # Python 3 has **kwargs as a keyword with no name, and *args as a Starred argument
+            arg_templates.append('**' + arg_template if keyword.arg is None else keyword.arg + '=' + arg_template)
+        if getattr(node, 'starargs', None) is not None:
+            node.starargs, arg_template = self.visit(node.starargs)
+            arg_templates.append('*' + arg_template)
+        if getattr(node, 'kwargs', None) is not None:
+            node.kwargs, arg_template = self.visit(node.kwargs)
+            arg_templates.append('**' + arg_template)
+        return self.capture(node, func_template + '(' + ', '.join(arg_templates) + ')')
+
+    def visit_BinOp(self, node):
+
+        node.left, left = self.visit(node.left)
+        node.right, right = self.visit(node.right)
+        operator = BINARY_OPERATORS[node.op.__class__]
+        return self.capture(node, parenthesize(left) + ' ' + operator + ' ' + parenthesize(right))
+
+    def visit_UnaryOp(self, node):
+
+        node.operand, operand = self.visit(node.operand)
+        return self.capture(node, UNARY_OPERATORS[node.op.__class__] + parenthesize(operand))
+
+    def visit_BoolOp(self, node):
+
+        templates = []
+        for index, value in enumerate(node.values):
+            node.values[index], template = self.visit(value)
+            templates.append(parenthesize(template))
+        operator = ' and ' if isinstance(node.op, ast.And) else ' or '
+        return self.capture(node, operator.join(templates))
+
+    def visit_Compare(self, node):
+
+        node.left, template = self.visit(node.left)
+        template = parenthesize(template)
+        for index, (operator, comparator) in enumerate(zip(node.ops, node.comparators)):
+            node.comparators[index], comparator_template = self.visit(comparator)
+            template += ' ' + COMPARISON_OPERATORS[operator.__class__] + ' ' + parenthesize(comparator_template)
+        return self.capture(node, template)
+
+    def visit_Starred(self, node):
+
+        node.value, template = self.visit(node.value)
+        return node, '*' + template
+
+    def visit_Tuple(self, node):
+
+        templates = []
+        for index, element in enumerate(node.elts):
+            node.elts[index], template = self.visit(element)
+            templates.append(template)
+        if len(templates) == 1:
+            return node, '(' + templates[0] + ',)'
+        return node, '(' + ', '.join(templates) + ')'
+
+    def visit_List(self, node):
+
+        templates = []
+        for index, element in enumerate(node.elts):
+            node.elts[index], template = self.visit(element)
+            templates.append(template)
+        return node, '[' + ', '.join(templates) + ']'
+
+
+def _scope_sensitive(node):
+
+    for child in ast.walk(node):
+        if isinstance(child, SCOPE_SENSITIVE_NODES):
+            return True
+        # Zero argument super() would pick up the lambda's argument instead of self
+        if (isinstance(child, ast.Call) and isinstance(child.func, ast.Name) and child.func.id == 'super'
+                and not child.args):
+            return True
+    return False
+
+
+class VerifyCallRewriter(ast.NodeTransformer):
+
+    def __init__(self, names=DEFAULT_NAMES):
+
+        self.names = frozenset(names)
+        # Lambdas can't see names bound in a class body, so calls made directly in one are left alone
+        self.in_class_body = [False]
+
+    def rewrite_module(self, tree):
+
+        tree = self.visit(tree)
+        # The helper import has to come after the docstring and any __future__ imports
+        position = 0
+        if tree.body and isinstance(tree.body[0], ast.Expr) and _string_literal(tree.body[0].value) is not None:
+            position = 1
+        while (position < len(tree.body) and isinstance(tree.body[position], ast.ImportFrom)
+               and tree.body[position].module == '__future__'):
+            position += 1
+        helper_import = ast.Import([ast.alias('disclose.rewrite', HELPER_NAME)])
+        if position < len(tree.body):
+            ast.copy_location(helper_import, tree.body[position])
+        tree.body.insert(position, helper_import)
+        return ast.fix_missing_locations(tree)
+
+    def visit_ClassDef(self, node):
+
+        self.in_class_body.append(True)
+        self.generic_visit(node)
+        self.in_class_body.pop()
+        return node
+
+    def visit_FunctionDef(self, node):
+
+        self.in_class_body.append(False)
+        self.generic_visit(node)
+        self.in_class_body.pop()
+        return node
+
+    def visit_AsyncFunctionDef(self, node):
+
+        return self.visit_FunctionDef(node)
+
+    def visit_Lambda(self, node):
+
+        return self.visit_FunctionDef(node)
+
+    def should_rewrite(self, node):
+
+        return (isinstance(node.func, ast.Name) and node.func.id in self.names and node.args
+                and not self.in_class_body[-1] and not isinstance(node.args[0], STARRED_NODES)
+                and not _scope_sensitive(node.args[0]))
+
+    def visit_Call(self, node):
+
+        if not self.should_rewrite(node):
+            return self.generic_visit(node)
+        capture = ExpressionCapture()
+        expression, description = capture.visit_root(node.args[0])
+        site = (description, tuple(capture.components), tuple(capture.opaque), capture.count, capture.equality)
+        evaluate = ast.parse('lambda capture: None', mode='eval').body
+        if PY2:
+            evaluate.args.args[0].id = CAPTURE_NAME
+        else:
+            evaluate.args.args[0].arg = CAPTURE_NAME
+        evaluate.body = expression
+        node.args = [self.visit(arg) for arg in node.args[1:]]
+        node.keywords = [self.visit(keyword) for keyword in node.keywords]
+        if getattr(node, 'starargs', None) is not None:
+            node.starargs = self.visit(node.starargs)
+        if getattr(node, 'kwargs', None) is not None:
+            node.kwargs = self.visit(node.kwargs)
+        node.args[:0] = [node.func, evaluate, _constant(site)]
+        node.func = ast.Attribute(ast.Name(HELPER_NAME, ast.Load()), 'call', ast.Load())
+        return node
+
+
+def _constant(value):
+
+    if isinstance(value, tuple):
+        return ast.Tuple([_constant(element) for element in value], ast.Load())
+    if not PY2:
+        return ast.Constant(value)
+    if value is None:
+        return ast.Name('None', ast.Load())
+    if isinstance(value, str):
+        return ast.Str(value)
+    return ast.Num(value)
+
+
+def _constant_value(node):
+
+    return node.n if PY2 else node.value
+
+
+def _string_literal(node):
+
+    if PY2:
+        if isinstance(node, ast.Str):
+            return node.s if isinstance(node.s, str) else node.s.encode('utf-8')
+    elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def _call(func, args):
+
+    if PY2:
+        return ast.Call(func, args, [], None, None)
+    return ast.Call(func, args, [])
+
+
+def rewrite_source(source, filename, names=DEFAULT_NAMES, assertion_hook=None):
+
+    tree = ast.parse(source, filename)
+    tree = VerifyCallRewriter(names).rewrite_module(tree)
+    if assertion_hook is not None:
+        # The assert rewriting pytest would have done had its hook (assertion_hook) loaded the module
+        rewrite_asserts = sys.modules[type(assertion_hook).__module__].rewrite_asserts
+        rewrite_asserts(tree, source, filename, assertion_hook.config)
+    return compile(tree, filename, 'exec', dont_inherit=True)
+
+
+#### IMPORT HOOK
+
+
+def cache_path(filename):
+
+    directory, basename = os.path.split(filename)
+    return os.path.join(directory, '__pycache__', os.path.splitext(basename)[0] + '.' + CACHE_TAG + '.pyc')
+
+
+def _cache_header(source_stat, names):
+
+    # The names rewritten change the generated code, so they're part of what the cache is valid for
+    names_digest = md5('\0'.join(sorted(names)).encode('utf-8')).digest()[:8]
+    return MAGIC + struct.pack('<II', int(source_stat.st_mtime) & 0xFFFFFFFF,
+                                         source_stat.st_size & 0xFFFFFFFF) + names_digest
+
+
+def read_cache(filename, source_stat, names=DEFAULT_NAMES):
+
+    try:
+        with open(cache_path(filename), 'rb') as cache_file:
+            data = cache_file.read()
+    except (IOError, OSError):
+        return None
+    header = _cache_header(source_stat, names)
+    if not data.startswith(header):
+        return None
+    try:
+        return marshal.loads(data[len(header):])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def write_cache(filename, source_stat, code, names=DEFAULT_NAMES):
+
+    path = cache_path(filename)
+    # Written under a temporary name and renamed so concurrent imports never see a partial file
+    temporary_path = '{}.{}'.format(path, os.getpid())
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.mkdir(directory)
+        with open(temporary_path, 'wb') as cache_file:
+            cache_file.write(_cache_header(source_stat, names) + marshal.dumps(code))
+        os.rename(temporary_path, path)
+    except (IOError, OSError):
+        # Read only trees, races on mkdir, etc.  We just go without a cache.
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+
+
+class RewritingLoader(object):
+
+    def __init__(self, finder, filename, assertion_hook=None):
+
+        self.finder = finder
+        self.filename = filename
+        self.assertion_hook = assertion_hook
+
+    def get_code(self, fullname=None):
+
+        source_stat = os.stat(self.filename)
+        # Code with pytest's asserts rewritten too is cached apart, and per pytest version
+        cache_names = self.finder.names
+        if self.assertion_hook is not None:
+            cache_names += ('@pytest-' + sys.modules['pytest'].__version__,)
+        code = read_cache(self.filename, source_stat, cache_names)
+        if code is None:
+            # Read as bytes so the parser honours any coding declaration
+            with open(self.filename, 'rb') as source_file:
+                source = source_file.read()
+            code = rewrite_source(source, self.filename, self.finder.names, self.assertion_hook)
+            write_cache(self.filename, source_stat, code, cache_names)
+        return code
+
+    def create_module(self, spec):
+
+        return None
+
+    def exec_module(self, module):
+
+        exec(self.get_code(module.__name__), module.__dict__)
+
+    def load_module(self, fullname):
+
+        if fullname in sys.modules:
+            return sys.modules[fullname]
+        code = self.get_code()
+        module = sys.modules[fullname] = imp.new_module(fullname)
+        module.__file__ = self.filename
+        module.__loader__ = self
+        module.__package__ = fullname.rpartition('.')[0]
+        try:
+            exec(code, module.__dict__)
+        except:
+            del sys.modules[fullname]
+            raise
+        return sys.modules[fullname]
+
+
+class RewritingFinder(object):
+
+    def __init__(self, patterns=DEFAULT_PATTERNS, names=DEFAULT_NAMES):
+
+        self.patterns = tuple(patterns)
+        self.names = tuple(names)
+
+    def matches(self, filename):
+
+        basename = os.path.basename(filename)
+        return any(fnmatch(basename, pattern) for pattern in self.patterns)
+
+    def assertion_hook(self, fullname, path):
+
+        # pytest's assertion rewriting hook, if it would have rewritten the module.  This finder
+        # comes first, so the module's asserts are rewritten along with its verify calls instead.
+        # pytest's hooks on Python 2 load modules as they find them, so they're left out there.
+        for finder in sys.meta_path:
+            if type(finder).__name__ == 'AssertionRewritingHook' and hasattr(finder, 'find_spec'):
+                return finder if finder.find_spec(fullname, path) is not None else None
+        return None
+
+    def find_spec(self, fullname, path=None, target=None):
+
+        spec = PathFinder.find_spec(fullname, path)
+        if spec is None or not isinstance(spec.loader, SourceFileLoader) or not self.matches(spec.origin):
+            return None
+        spec.loader = RewritingLoader(self, spec.origin, self.assertion_hook(fullname, path))
+        return spec
+
+    def find_module(self, fullname, path=None):
+
+        try:
+            source_file, filename, (suffix, mode, kind) = imp.find_module(fullname.rpartition('.')[2], path)
+        except ImportError:
+            return None
+        if source_file:
+            source_file.close()
+        if kind != imp.PY_SOURCE or not self.matches(filename):
+            return None
+        return RewritingLoader(self, filename)
+
+
+def install(patterns=DEFAULT_PATTERNS, names=DEFAULT_NAMES):
+
+    # First, so test modules come here rather than to pytest's assertion rewriting hook (see
+    # RewritingFinder.assertion_hook)
+    finder = RewritingFinder(patterns, names)
+    sys.meta_path.insert(0, finder)
+    return finder
+
+
+def uninstall(finder=None):
+
+    for installed in list(sys.meta_path):
+        if isinstance(installed, RewritingFinder) and finder in (None, installed):
+            sys.meta_path.remove(installed)
@@ -0,0 +1,23 @@
+# Entry point of the pytest plugin in disclose.pytest_plugin, registered through
+# the pytest11 entry point, so it is loaded by every pytest run wherever disclose
+# is installed.  It's kept out of the disclose package, since importing that
+# patches json for the whole process: disclose is only imported, and its plugin
+# registered, when a test first asks for the verify fixture.
+
+import pytest
+
+
+PLUGIN_NAME = 'disclose-session'
+
+
+@pytest.fixture
+def verify(request):
+
+    pluginmanager = request.config.pluginmanager
+    plugin = pluginmanager.get_plugin(PLUGIN_NAME)
+    if plugin is None:
+        from disclose.pytest_plugin import DisclosePlugin
+        plugin = DisclosePlugin()
+        pluginmanager.register(plugin, PLUGIN_NAME)
+    yield plugin.start(request.node)
+    plugin.finish()
@@ -11,6 +11,12 @@ setup(name='disclose',
       classifiers=['Development Status :: 4 - Beta',
                    'Intended Audience :: Developers',
                    'Intended Audience :: Information Technology',
+                   'Programming Language :: Python :: 2',
+                   'Programming Language :: Python :: 2.7',
+                   'Programming Language :: Python :: 3',
                    'Topic :: Software Development :: Quality Assurance',
                    'Topic :: Software Development :: Testing'],
-      packages=find_packages())
+      python_requires='>=2.7, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*, !=3.4.*, !=3.5.*, !=3.6.*, !=3.7.*',
+      packages=find_packages(),
+      py_modules=['pytest_disclose'],
+      entry_points={'pytest11': ['disclose = pytest_disclose']})